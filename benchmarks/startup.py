@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Cold start benchmark of llb3d command line.
+
+Every command is run in a new python process; minimum and median wall
+time are printed. Run from repository root: python benchmarks/startup.py
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import pathlib
+
+SOURCE = 'Print "Hello, world!"\n'
+
+def commands(directory: pathlib.Path) -> dict:
+    """Return benchmarked commands."""
+    source = directory / 'hello.bb'
+    source.write_text(SOURCE)
+    return {
+        'import llb3d': [sys.executable, '-c', 'import llb3d'],
+        'import llb3d.driver': [sys.executable, '-c', 'import llb3d.driver'],
+        'llb3d --help': [sys.executable, '-m', 'llb3d', '--help'],
+        'llb3d build --emit llvm': [sys.executable, '-m', 'llb3d', 'build', str(source),
+                                    '--emit', 'llvm', '-o', str(directory / 'hello.ll')],
+    }
+
+def measure(command, repeat: int) -> list:
+    """Return wall times of command runs."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+def main():
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--repeat', type=int, default=10,
+                        help='runs of every command')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, command in commands(pathlib.Path(directory)).items():
+            # The first run warms up bytecode and parse tables
+            measure(command, 1)
+            times = measure(command, args.repeat)
+            print('{name:<28} min {min:8.1f} ms   median {median:8.1f} ms'
+                  .format(name=name, min=min(times) * 1000,
+                          median=statistics.median(times) * 1000))
+
+if __name__ == '__main__':
+    main()
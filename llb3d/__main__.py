@@ -3,19 +3,263 @@
 """llb3d - LLVM Blitz3d implementation."""
 
 import argparse
+import os
+import sys
 
 from . import __version__
 
+BACKEND_OPTIONS = ('pipeline', 'native', 'lto', 'debug', 'cache', 'cache_dir', 'codegen_jobs')
+
+def backend_options(args) -> dict:
+    """Return backend options from command line, see driver.create_backend."""
+    options = {name: getattr(args, name) for name in BACKEND_OPTIONS}
+    if options['cache_dir'] is not None:
+        options['cache_dir'] = os.path.abspath(options['cache_dir'])
+    return options
+
+def configure_backend(args):
+    """Create backend with options from command line."""
+    from .driver import create_backend #pylint: disable=import-outside-toplevel
+
+    return create_backend(**backend_options(args))
+
+def daemon_client(args):
+    """Return client of running daemon or None, if it shouldn't be used.
+
+    Time reports are collected only in current process.
+    """
+    if args.no_daemon or getattr(args, 'time_report', False) or \
+       getattr(args, 'time_report_json', None) is not None:
+        return None
+
+    from .client import connect #pylint: disable=import-outside-toplevel
+    return connect(args.socket)
+
+def daemon_request(client, command_args, command, **fields) -> dict:
+    """Send compile request to daemon, exit on error."""
+    options = backend_options(command_args)
+    options['validate'] = command_args.validate
+    with client:
+        response = client.request(command, source=os.path.abspath(command_args.source),
+                                  options=options, **fields)
+    if response['status'] != 'ok':
+        print('{source}: {error}'.format(source=command_args.source,
+                                         error=response['message']),
+              file=sys.stderr)
+        sys.exit(1)
+    return response
+
+def write_report(report, args):
+    """Write time report in text and json formats."""
+    if args.time_report:
+        print(report, file=sys.stderr)
+    if args.time_report_json == '-':
+        print(report.to_json())
+    elif args.time_report_json is not None:
+        with open(args.time_report_json, 'w') as output:
+            output.write(report.to_json())
+
+def build_many(args):
+    """Build many programs in parallel, print results as they are ready."""
+    from . import driver #pylint: disable=import-outside-toplevel
+
+    failed = False
+    for result in driver.build_many(args.sources, args.emit, backend_options(args),
+                                    args.jobs, args.validate):
+        if result.error is not None:
+            failed = True
+            print('{source}: {error}'.format(source=result.source, error=result.error),
+                  file=sys.stderr, flush=True)
+        else:
+            print('{source} -> {output}'.format(source=result.source, output=result.output),
+                  flush=True)
+    if failed:
+        sys.exit(1)
+
+def build(args):
+    """Build program."""
+    if len(args.sources) > 1:
+        build_many(args)
+        return
+    args.source = args.sources[0]
+
+    client = daemon_client(args)
+    if client is not None:
+        output = os.path.abspath(args.output) if args.output is not None else None
+        daemon_request(client, args, 'build', output=output, emit=args.emit)
+        return
+
+    from . import ast, driver #pylint: disable=import-outside-toplevel
+    from .report import Report, ReportProvider #pylint: disable=import-outside-toplevel
+
+    ast.set_validation(args.validate)
+
+    report = Report(trace_memory=args.time_report or args.time_report_json is not None)
+    backend = None
+    try:
+        with ReportProvider(report):
+            backend = configure_backend(args)
+            driver.build(args.source, args.output, args.emit, backend)
+    except SyntaxError as error:
+        print('{source}: {error}'.format(source=args.source, error=error.msg), file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if backend is not None and backend.cache is not None:
+            report.cache = backend.cache.stats()
+        write_report(report, args)
+
+def daemon_run(client, args) -> int:
+    """Compile program with daemon, run it in current process and return exit code."""
+    import subprocess #pylint: disable=import-outside-toplevel
+    import tempfile #pylint: disable=import-outside-toplevel
+
+    with tempfile.TemporaryDirectory() as directory:
+        response = daemon_request(client, args, 'compile', directory=directory, jit=args.jit)
+        sys.stdout.flush()
+        if not args.jit:
+            return subprocess.run((response['executable'], ) + tuple(args.args),
+                                  check=False).returncode
+
+        backend = configure_backend(args)
+        with open(response['bitcode'], 'rb') as bitcode:
+            backend.load_optimized(bitcode.read())
+        for filename in response['unit_objects']:
+            with open(filename, 'rb') as unit_object:
+                backend.unit_objects.append(unit_object.read())
+        return backend.run(*args.args, check=False, jit=True).returncode
+
+def run(args):
+    """Build and run program, exit with its exit code."""
+    client = daemon_client(args)
+    if client is not None:
+        sys.exit(daemon_run(client, args))
+
+    from . import ast, driver #pylint: disable=import-outside-toplevel
+
+    ast.set_validation(args.validate)
+    backend = configure_backend(args)
+    try:
+        with open(args.source, encoding='utf-8') as source:
+            driver.compile_source(source.read(), backend,
+                                  os.path.dirname(os.path.abspath(args.source)))
+    except SyntaxError as error:
+        print('{source}: {error}'.format(source=args.source, error=error.msg), file=sys.stderr)
+        sys.exit(1)
+
+    sys.stdout.flush()
+    sys.exit(backend.run(*args.args, check=False, jit=args.jit).returncode)
+
+def watch(args):
+    """Rebuild and rerun program on every change of its files."""
+    from . import ast #pylint: disable=import-outside-toplevel
+    from .watch import Watcher #pylint: disable=import-outside-toplevel
+
+    ast.set_validation(args.validate)
+    watcher = Watcher(args.source, backend_options(args), args.jit, args.args, args.output)
+    try:
+        watcher.watch(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+def serve(args):
+    """Run compiler daemon."""
+    from .server import CompilerServer #pylint: disable=import-outside-toplevel
+
+    server = CompilerServer(args.socket)
+    print('llb3d daemon is listening on {path}'.format(path=server.path), flush=True)
+    server.serve()
+
+def add_backend_arguments(parser):
+    """Add backend options to command parser."""
+    from .pipeline import PIPELINES #pylint: disable=import-outside-toplevel
+
+    parser.add_argument('--pipeline', choices=sorted(PIPELINES), default='balanced',
+                        help='optimization pipeline preset')
+    parser.add_argument('--native', action='store_true',
+                        help='tune code for current cpu')
+    parser.add_argument('--lto', action='store_true',
+                        help='link runtime bitcode into program')
+    parser.add_argument('--debug', action='store_true',
+                        help='debug build')
+    parser.add_argument('--codegen-jobs', type=int, default=1, metavar='N',
+                        help='optimize and emit functions in N parallel partitions')
+    parser.add_argument('--validate', action='store_true',
+                        help='type check syntax tree nodes')
+    parser.add_argument('--cache', action='store_true',
+                        help='use compilation cache')
+    parser.add_argument('--cache-dir', default=None,
+                        help='compilation cache directory (XDG cache directory by default)')
+
+def add_daemon_arguments(parser, client=True):
+    """Add daemon options to command parser."""
+    parser.add_argument('--socket', default=None,
+                        help='daemon socket (in XDG runtime directory by default)')
+    if client:
+        parser.add_argument('--no-daemon', action='store_true',
+                            help="don't use running daemon")
+
+def add_report_arguments(parser):
+    """Add time report options to command parser."""
+    parser.add_argument('--time-report', action='store_true',
+                        help='print time and memory of compiler phases')
+    parser.add_argument('--time-report-json', metavar='FILE', default=None,
+                        help="write time report in json to FILE ('-' for stdout)")
+
 def main():
     """Execute, when user call llb3d."""
     parser = argparse.ArgumentParser(description='llb3d ' + __version__)
 
-    parser.add_subparsers(title='commands',
-                          help='commands for compiler')
+    subparsers = parser.add_subparsers(title='commands',
+                                       help='commands for compiler')
+
+    build_parser = subparsers.add_parser('build', help='build programs')
+    build_parser.add_argument('sources', nargs='+', metavar='source', help='source files')
+    build_parser.add_argument('-o', '--output', default=None,
+                              help='output file (for single source file)')
+    build_parser.add_argument('-j', '--jobs', type=int, default=None,
+                              help='parallel jobs for many source files (cpu count by default)')
+    build_parser.add_argument('--emit', choices=('exe', 'asm', 'llvm', 'obj'), default='exe',
+                              help='output type')
+    add_backend_arguments(build_parser)
+    add_report_arguments(build_parser)
+    add_daemon_arguments(build_parser)
+    build_parser.set_defaults(func=build)
+
+    run_parser = subparsers.add_parser('run', help='build and run program')
+    run_parser.add_argument('source', help='source file')
+    run_parser.add_argument('args', nargs=argparse.REMAINDER,
+                            help='program arguments')
+    run_parser.add_argument('--jit', action='store_true',
+                            help='run program in-process with jit')
+    add_backend_arguments(run_parser)
+    add_daemon_arguments(run_parser)
+    run_parser.set_defaults(func=run)
+
+    watch_parser = subparsers.add_parser('watch', help='rebuild and rerun program on changes')
+    watch_parser.add_argument('source', help='source file')
+    watch_parser.add_argument('args', nargs=argparse.REMAINDER,
+                              help='program arguments')
+    watch_parser.add_argument('-o', '--output', default=None,
+                              help='output file')
+    watch_parser.add_argument('--jit', action='store_true',
+                              help='run program in-process with jit')
+    watch_parser.add_argument('--interval', type=float, default=0.2, metavar='SECONDS',
+                              help='file polling interval')
+    add_backend_arguments(watch_parser)
+    watch_parser.set_defaults(func=watch, cache=True)
+
+    serve_parser = subparsers.add_parser('serve', help='run compiler daemon')
+    add_daemon_arguments(serve_parser, client=False)
+    serve_parser.set_defaults(func=serve)
 
     args = parser.parse_args()
+    if getattr(args, 'output', None) is not None and len(getattr(args, 'sources', ())) > 1:
+        parser.error('-o/--output is allowed only for single source file')
 
     if 'func' not in args:
         parser.print_help()
     else:
         args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -1,58 +1,234 @@
 # -*- coding: utf-8 -*-
 
-"""Ast for llb3d."""
+"""Ast for llb3d.
 
-import collections
-from typing import Tuple
-from textwrap import indent
-from inspect import signature
+Node constructors are type checked in validation mode, that is on by default
+in debug and off with python -O or LLB3D_VALIDATE=0. Use set_validation to
+switch it and validate to check a finished tree in one sweep.
+"""
 
-from typeguard import typechecked
+import io
+import os
+import string
+import functools
+import collections
+from typing import Tuple, get_type_hints
+from inspect import signature, unwrap
 
 IDENT = 2
 
+_validation = os.environ.get('LLB3D_VALIDATE', '1' if __debug__ else '0') != '0'
+_CHECKED_METHODS = []
+
+class checked: #pylint: disable=invalid-name
+    """Method decorator, type checked only in validation mode.
+
+    typeguard is slow to import, so type checked function is created
+    on the first call.
+    """
+
+    def __init__(self, function):
+        """Initialize self.  See help(type(self)) for accurate signature."""
+        self.function = function
+        self._checked_function = None
+
+    @property
+    def checked_function(self):
+        """Return type checked function."""
+        if self._checked_function is None:
+            from typeguard import typechecked #pylint: disable=import-outside-toplevel
+            self._checked_function = typechecked(self.function)
+        return self._checked_function
+
+    def install(self, owner, name, enabled: bool):
+        """Set plain or type checked function as owner attribute."""
+        if not enabled:
+            setattr(owner, name, self.function)
+        elif self._checked_function is not None:
+            setattr(owner, name, self._checked_function)
+        else:
+            @functools.wraps(self.function)
+            def first_call(*args, **kwargs):
+                """Install type checked function and call it."""
+                setattr(owner, name, self.checked_function)
+                return self.checked_function(*args, **kwargs)
+            setattr(owner, name, first_call)
+
+    def __set_name__(self, owner, name):
+        """Replace self with plain or type checked function."""
+        _CHECKED_METHODS.append((owner, name, self))
+        self.install(owner, name, _validation)
+
+def set_validation(enabled: bool):
+    """Switch type checks in node constructors on or off."""
+    global _validation #pylint: disable=global-statement
+    _validation = enabled
+    for owner, name, method in _CHECKED_METHODS:
+        method.install(owner, name, enabled)
+
+def get_validation() -> bool:
+    """Return True in validation mode."""
+    return _validation
+
+_LAYOUTS = {}
+
+def _layout(keys: tuple) -> dict:
+    """Return key -> index dict, shared between dicts with the same keys."""
+    layout = _LAYOUTS.get(keys)
+    if layout is None:
+        layout = _LAYOUTS.setdefault(keys, {key: index for index, key in enumerate(keys)})
+    return layout
+
+def _restore_dict(cls, keys, values):
+    """Restore pickled frozen dict."""
+    #pylint: disable=protected-access
+    frozen_dict = cls.__new__(cls)
+    frozen_dict._layout = _layout(keys)
+    frozen_dict._values = values
+    frozen_dict._hash = None
+    return frozen_dict
+
+def _restore_statement(cls, keys, values, format_str):
+    """Restore pickled statement."""
+    #pylint: disable=protected-access
+    statement = _restore_dict(cls, keys, values)
+    statement._format_str = format_str
+    return statement
+
+def _unhashed_children(values: tuple) -> list:
+    """Return frozen dicts without cached hash in values and tuple values."""
+    #pylint: disable=protected-access
+    children = []
+    for value in values:
+        if isinstance(value, FrozenDict):
+            if value._hash is None:
+                children.append(value)
+        elif isinstance(value, tuple):
+            children.extend(item for item in value
+                            if isinstance(item, FrozenDict) and item._hash is None)
+    return children
+
+_PARAMS = {}
+_FORMATS = {}
+
+def _parse_format(format_str: str) -> tuple:
+    """Return parsed format string, see string.Formatter.parse."""
+    if format_str not in _FORMATS:
+        _FORMATS[format_str] = tuple(string.Formatter().parse(format_str))
+    return _FORMATS[format_str]
+
+def _init_params(cls) -> tuple:
+    """Return names of cls.__init__ parameters (without self)."""
+    if cls not in _PARAMS:
+        _PARAMS[cls] = tuple(signature(cls.__init__).parameters.keys())[1:]
+    return _PARAMS[cls]
+
 class FrozenDict(collections.Mapping):
-    """Frozen dict."""
+    """Frozen dict.
+
+    Values are stored in tuple, key layout is shared between dicts
+    with the same keys and hash is computed on demand.
+    """
+
+    __slots__ = ('_layout', '_values', '_hash')
 
     def __init__(self, **kwargs):
         """Initialize self.  See help(type(self)) for accurate signature."""
-        self._dict = dict(**kwargs)
-
-        # It would have been simpler and maybe more obvious to
-        # use hash(tuple(sorted(self._d.iteritems())))
-        # so far, but this solution is O(n).
-        self._hash = 0
-        for pair in self.items():
-            self._hash ^= hash(pair)
+        self._layout = _layout(tuple(kwargs))
+        self._values = tuple(kwargs.values())
+        self._hash = None
 
     def __iter__(self):
         """Implement iter(self)."""
-        return iter(self._dict)
+        return iter(self._layout)
 
     def __len__(self) -> int:
         """Implement len(self)."""
-        return len(self._dict)
+        return len(self._values)
 
     def __getitem__(self, key):
         """Implement self[key]."""
-        return self._dict[key]
+        return self._values[self._layout[key]]
+
+    def _compute_hash(self) -> int:
+        """Return hash of items."""
+        # It would have been simpler and maybe more obvious to
+        # use hash(tuple(sorted(self.items())))
+        # so far, but this solution is O(n).
+        result = 0
+        for pair in zip(self._layout, self._values):
+            result ^= hash(pair)
+        return result
 
     def __hash__(self) -> int:
-        """Implement hash(self)."""
+        """Implement hash(self).
+
+        Unhashed children are hashed first in post-order without recursion,
+        so deep trees don't overflow the stack.
+        """
+        if self._hash is None:
+            #pylint: disable=protected-access
+            stack = [self]
+            while stack:
+                node = stack[-1]
+                children = _unhashed_children(node._values)
+                if children:
+                    stack.extend(children)
+                    continue
+                stack.pop()
+                if node._hash is None:
+                    node._hash = node._compute_hash()
         return self._hash
 
     def __eq__(self, other) -> bool:
         """Return self==other."""
+        #pylint: disable=too-many-return-statements
+        if self is other:
+            return True
+
         if type(self) is not type(other) or hash(self) != hash(other):
             return False
 
+        # Children are compared without recursion, like in __hash__
         #pylint: disable=protected-access
-        return self._dict == other._dict
-
-    @typechecked
+        stack = [(self, other)]
+        while stack:
+            left, right = stack.pop()
+            if left is right:
+                continue
+            if isinstance(left, FrozenDict) and type(left).__eq__ is FrozenDict.__eq__:
+                if type(left) is not type(right) or hash(left) != hash(right):
+                    return False
+                if left._layout is right._layout:
+                    stack.extend(zip(left._values, right._values))
+                elif left.keys() == right.keys():
+                    stack.extend((left[key], right[key]) for key in left)
+                else:
+                    return False
+            elif isinstance(left, tuple) and isinstance(right, tuple):
+                if len(left) != len(right):
+                    return False
+                stack.extend(zip(left, right))
+            elif left != right:
+                return False
+        return True
+
+    def __reduce__(self):
+        """Helper for pickle."""
+        return (_restore_dict, (type(self), tuple(self._layout), self._values))
+
+    def replace(self, **changes):
+        """Return copy of self with changed items."""
+        items = dict(self.items())
+        items.update(changes)
+        return type(self)(**items)
+
+    @checked
     def __getattr__(self, name: str):
         """Return name from dict."""
-        return self._dict[name]
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
 
 class Statement(FrozenDict):
     """Basic statement.
@@ -66,27 +242,64 @@ class Statement(FrozenDict):
     'Hello, Alice!'
     """
 
+    __slots__ = ('_format_str', )
+
     def __init__(self, format_str, **kwds):
         """Initialize self.  See help(type(self)) for accurate signature."""
         super().__init__(**kwds)
-        self._hash ^= hash(format_str) ^ hash(type(self))
         self._format_str = format_str
 
+    def _compute_hash(self) -> int:
+        """Return hash of items, format and type."""
+        return super()._compute_hash() ^ hash(self._format_str) ^ hash(type(self))
+
+    def __reduce__(self):
+        """Helper for pickle."""
+        return (_restore_statement, (type(self), tuple(self._layout), self._values,
+                                     self._format_str))
+
+    def replace(self, **changes):
+        """Return copy of node with changed fields.
+
+        >>> Identifier('x').replace(name='y')
+        Identifier('y')
+        """
+        return type(self)(*(changes[name] if name in changes else self[name]
+                            for name in _init_params(type(self))))
+
+    def write_to(self, stream, level=0):
+        """Write statement to text stream.
+
+        Nested statements are written directly to the stream, level is
+        the indentation level of the statement, nested code blocks are
+        indented by one more level.
+        """
+        for literal_text, field_name, format_spec, _ in _parse_format(self._format_str):
+            stream.write(literal_text)
+            if field_name is not None:
+                value = self[field_name]
+                if isinstance(value, Statement):
+                    value.write_to(stream, level)
+                else:
+                    stream.write(format(value, format_spec))
+
     def __str__(self) -> str:
         """Implement str(self)."""
-        return self._format_str.format(**self)
+        stream = io.StringIO()
+        self.write_to(stream)
+        return stream.getvalue()
 
     def __repr__(self) -> str:
         """Implemet repr(self)."""
-        sig = signature(type(self).__init__)
-        params = tuple(sig.parameters.keys())
-        params_str = ', '.join(repr(self[c]) for c in params[1:])
+        params_str = ', '.join(repr(self[c]) for c in _init_params(type(self)))
         return ("{cls}({params_str})"
                 .format(cls=type(self).__name__, params_str=params_str))
 
 class Expression(Statement):
     """Basic expression."""
 
+    __slots__ = ()
+
 class Identifier(Expression):
     """Identifier for variable or function.
 
@@ -97,7 +310,9 @@ class Identifier(Expression):
     'Alice'
     """
 
-    @typechecked
+    __slots__ = ()
+
+    @checked
     def __init__(self, name: str):
         """Initialize self.  See help(type(self)) for accurate signature."""
         super().__init__('{name}', name=name)
@@ -105,6 +320,8 @@ class Identifier(Expression):
 class Literal(Expression):
     """Abstract literal."""
 
+    __slots__ = ()
+
     def __init__(self, value):
         """Initialize self.  See help(type(self)) for accurate signature."""
         super().__init__('{value}', value=value)
@@ -118,7 +335,9 @@ class IntLiteral(Literal):
     to +2147483647 (int32).
     """
 
-    @typechecked
+    __slots__ = ()
+
+    @checked
     def __init__(self, value: int):
         """Initialize self.  See help(type(self)) for accurate signature."""
         super().__init__(value)
@@ -130,11 +349,27 @@ class FloatLiteral(Literal):
     For example: .5, -10.1, 0.0 are all floating point values (float32).
     """
 
-    @typechecked
+    __slots__ = ()
+
+    @checked
     def __init__(self, value: float):
         """Initialize self.  See help(type(self)) for accurate signature."""
         super().__init__(value)
 
+    def _compute_hash(self) -> int:
+        """Return hash of value representation."""
+        return hash(repr(self['value'])) ^ hash(type(self))
+
+    def __eq__(self, other) -> bool:
+        """Return self==other.
+
+        Literals are equal, when values are the same, so 0.0 and -0.0 are
+        different and nan is equal to nan.
+        """
+        return type(self) is type(other) and repr(self['value']) == repr(other['value'])
+
+    __hash__ = Literal.__hash__
+
 class StrLiteral(Literal):
     """String literal.
 
@@ -142,7 +377,9 @@ class StrLiteral(Literal):
     "What's up?", "***** GAME OVER *****", "".
     """
 
-    @typechecked
+    __slots__ = ()
+
+    @checked
     def __init__(self, value: str):
         """Initialize self.  See help(type(self)) for accurate signature."""
         super().__init__(value)
@@ -150,7 +387,9 @@ class StrLiteral(Literal):
 class UnaryOp(Expression):
     """Unary operator."""
 
-    @typechecked
+    __slots__ = ()
+
+    @checked
     def __init__(self, op: str, right: Expression):
         """Initialize self.  See help(type(self)) for accurate signature."""
         super().__init__('{op}{right}', op=op, right=right)
@@ -158,7 +397,9 @@ class UnaryOp(Expression):
 class BinaryOp(Expression):
     """Binary operator."""
 
-    @typechecked
+    __slots__ = ()
+
+    @checked
     def __init__(self, op: str, left: Expression, right: Expression):
         """Initialize self.  See help(type(self)) for accurate signature."""
         super().__init__('({left} {op} {right})', op=op, left=left, right=right)
@@ -166,12 +407,35 @@ class BinaryOp(Expression):
 class ProcedureCall(Statement):
     """Procedure call."""
 
-    @typechecked
+    __slots__ = ()
+
+    @checked
     def __init__(self, procedure: Identifier, args: Tuple[Expression, ...]):
         """Initialize self.  See help(type(self)) for accurate signature."""
-        args_str = ', '.join(str(arg) for arg in args)
-        super().__init__('{procedure} {args_str}', procedure=procedure,
-                         args=args, args_str=args_str)
+        super().__init__('{procedure} {args}', procedure=procedure, args=args)
+
+    def write_to(self, stream, level=0):
+        """Write statement to text stream."""
+        self['procedure'].write_to(stream)
+        stream.write(' ')
+        for index, arg in enumerate(self['args']):
+            if index > 0:
+                stream.write(', ')
+            arg.write_to(stream)
+
+class Include(Statement):
+    """Include of other source file.
+
+    >>> str(Include('lib.bb'))
+    'Include "lib.bb"'
+    """
+
+    __slots__ = ()
+
+    @checked
+    def __init__(self, path: str):
+        """Initialize self.  See help(type(self)) for accurate signature."""
+        super().__init__('Include "{path}"', path=path)
 
 class Body(Statement):
     """Code block.
@@ -179,20 +443,92 @@ class Body(Statement):
     For example, global body or function body.
     """
 
-    @typechecked
+    __slots__ = ()
+
+    @checked
     def __init__(self, statements: Tuple[Statement, ...]):
         """Initialize self.  See help(type(self)) for accurate signature."""
         super().__init__('Code block', statements=statements)
 
-    def __str__(self) -> str:
-        """Implement str(self)."""
-        result = '\n'.join(map(str, self['statements']))
-        indented = indent(result, ' ' * IDENT)
-        return indented
+    def write_to(self, stream, level=0):
+        """Write code block with statements indented by one more level."""
+        self.write_statements(stream, level + 1)
+
+    def write_statements(self, stream, level):
+        """Write statements line by line with indentation level."""
+        for index, statement in enumerate(self['statements']):
+            if index > 0:
+                stream.write('\n')
+            if not isinstance(statement, Body):
+                stream.write(' ' * IDENT * level)
+            statement.write_to(stream, level)
 
 class Program(Body):
     """Code block without identation."""
 
-    def __str__(self) -> str:
-        """Implement str(self)."""
-        return '\n'.join(map(str, self['statements']))
+    __slots__ = ()
+
+    def write_to(self, stream, level=0):
+        """Write statements without extra indentation."""
+        self.write_statements(stream, level)
+
+class Interner:
+    """Hash-consing node factory.
+
+    Return canonical instance for structurally equal nodes, so equality of
+    interned nodes is identity and subtrees are shared.
+
+    >>> interner = Interner()
+    >>> interner(Identifier, 'x') is interner(Identifier, 'x')
+    True
+    """
+
+    def __init__(self):
+        """Initialize self.  See help(type(self)) for accurate signature."""
+        self.nodes = {}
+
+    def intern(self, node: FrozenDict) -> FrozenDict:
+        """Return canonical instance for node."""
+        return self.nodes.setdefault(node, node)
+
+    def __call__(self, cls, *args):
+        """Create node of class cls and return canonical instance."""
+        return self.intern(cls(*args))
+
+    def __len__(self) -> int:
+        """Return count of canonical nodes."""
+        return len(self.nodes)
+
+_HINTS = {}
+
+def _init_hints(cls) -> dict:
+    """Return annotations of cls.__init__ parameters."""
+    if cls not in _HINTS:
+        hints = get_type_hints(unwrap(cls.__init__))
+        hints.pop('return', None)
+        _HINTS[cls] = hints
+    return _HINTS[cls]
+
+def validate(tree: FrozenDict):
+    """Check types of all node fields in the tree.
+
+    Raise TypeError for the first invalid node.
+
+    >>> validate(Program((IntLiteral(10), )))
+    """
+    from typeguard import check_type #pylint: disable=import-outside-toplevel
+
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        for name, expected_type in _init_hints(type(node)).items():
+            try:
+                check_type(name, node[name], expected_type)
+            except TypeError as error:
+                raise TypeError('{node!r}: {error}'.format(node=node, error=error)) from error
+
+        for value in node.values():
+            if isinstance(value, FrozenDict):
+                stack.append(value)
+            elif isinstance(value, tuple):
+                stack.extend(item for item in value if isinstance(item, FrozenDict))
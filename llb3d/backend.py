@@ -10,18 +10,52 @@ import subprocess
 import sys
 import os
 import stat
+import ctypes
+import signal
+import time
+import contextlib
 
 from llvmlite import ir, binding
 
+from . import ast
+from .cache import make_key
+from .pipeline import PIPELINES
+from .report import phase
+from .version import VERSION
+
 SOURCE_DIRECTORY = pathlib.Path(__file__).parent.resolve() / 'bbprogram'
 SOURCE_FILENAME = 'bbprogram.s'
+OBJECT_FILENAME = 'bbprogram.o'
 EXECUTABLE_FILENAME = 'bbprogram'
 SYSTEM_SHARED = pathlib.Path('/usr/lib/x86_64-linux-gnu')
-
-# All these initializations are required for code generation!
-binding.initialize()
-binding.initialize_native_target()
-binding.initialize_native_asmprinter()  # yes, even this one
+RUNTIME_LIBRARY = 'libbbruntime.a'
+ICU_STATIC = ('libicuio.a', 'libicui18n.a', 'libicuuc.a', 'libicudata.a')
+RUNTIME_STATIC = (RUNTIME_LIBRARY, ) + ICU_STATIC
+RUNTIME_BITCODE = '*.bc'
+LTO_PRESERVED = ('main', )
+LTO_INLINING_THRESHOLD = 225
+SYSTEM_LIBRARIES = ('-lstdc++', '-lm', '-ldl', '-lpthread')
+RUNTIME_SHARED = ('libicudata.so', 'libicuuc.so', 'libicuio.so', 'libbbruntime.so')
+JIT_PROGRAM_NAME = '<jit>'
+ENTRY_NAME = 'bbmain'
+# subprocess.run keyword arguments, that are supported by Backend.run_jit
+JIT_RUN_OPTIONS = ('check', 'isolate', 'stdin', 'input', 'stdout', 'stderr', 'encoding',
+                   'timeout', 'cwd', 'env')
+STDIN_FILENO = 0
+STDOUT_FILENO = 1
+STDERR_FILENO = 2
+
+_LLVM_INITIALIZED = False
+
+def initialize_llvm():
+    """Initialize llvm on the first use."""
+    global _LLVM_INITIALIZED #pylint: disable=global-statement
+    if not _LLVM_INITIALIZED:
+        # All these initializations are required for code generation!
+        binding.initialize()
+        binding.initialize_native_target()
+        binding.initialize_native_asmprinter()  # yes, even this one
+        _LLVM_INITIALIZED = True
 
 # Load libraries
 def load_shared_library(name):
@@ -31,6 +65,116 @@ def load_shared_library(name):
     else:
         binding.load_library_permanently(str(SYSTEM_SHARED / name))
 
+def runtime_version() -> str:
+    """Return version of compiler and prebuilt runtime."""
+    version = [VERSION]
+    filenames = [SOURCE_DIRECTORY / name for name in RUNTIME_STATIC] + runtime_bitcode()
+    for filename in filenames:
+        if filename.exists():
+            stat_result = filename.stat()
+            version.append('{name}:{size}:{mtime}'.format(name=filename.name,
+                                                          size=stat_result.st_size,
+                                                          mtime=stat_result.st_mtime_ns))
+    return ' '.join(version)
+
+def runtime_bitcode() -> list:
+    """Return list of prebuilt runtime bitcode files."""
+    return sorted(SOURCE_DIRECTORY.glob(RUNTIME_BITCODE))
+
+def link_runtime(llvm_module: binding.ModuleRef):
+    """Link runtime bitcode into module.
+
+    Everything except main is internalized, so runtime can be inlined
+    and specialized.
+    """
+    filenames = runtime_bitcode()
+    if not filenames:
+        raise RuntimeError('Runtime bitcode is not found in {directory}'
+                           .format(directory=SOURCE_DIRECTORY))
+
+    initialize_llvm()
+    for filename in filenames:
+        with open(filename, 'rb') as bitcode:
+            llvm_module.link_in(binding.parse_bitcode(bitcode.read()))
+
+    for symbol in tuple(llvm_module.functions) + tuple(llvm_module.global_variables):
+        if not symbol.is_declaration and symbol.name not in LTO_PRESERVED:
+            symbol.linkage = 'internal'
+
+_RUNTIME_LOADED = False
+
+def load_runtime():
+    """Load bbruntime and its dependencies into current process.
+
+    Required for in-process execution, libraries are loaded only once.
+    """
+    global _RUNTIME_LOADED #pylint: disable=global-statement
+    if not _RUNTIME_LOADED:
+        initialize_llvm()
+        for name in RUNTIME_SHARED:
+            load_shared_library(name)
+        _RUNTIME_LOADED = True
+
+_LIBC = ctypes.CDLL(None)
+
+@contextlib.contextmanager
+def redirect_fd(fileno, target, pipe_file):
+    """Redirect file descriptor to target, like subprocess.run do.
+
+    target can be None, subprocess.PIPE, subprocess.DEVNULL,
+    file descriptor or file object.
+    Output for subprocess.PIPE is written to pipe_file, input for
+    subprocess.PIPE is read from pipe_file.
+    """
+    if target is None:
+        yield
+        return
+
+    if target == subprocess.PIPE:
+        target_fileno = pipe_file.fileno()
+    elif target == subprocess.DEVNULL:
+        target_fileno = os.open(os.devnull, os.O_RDWR)
+    elif isinstance(target, int):
+        target_fileno = target
+    else:
+        target_fileno = target.fileno()
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    _LIBC.fflush(None)
+    saved_fileno = os.dup(fileno)
+    os.dup2(target_fileno, fileno)
+    try:
+        yield
+    finally:
+        _LIBC.fflush(None)
+        os.dup2(saved_fileno, fileno)
+        os.close(saved_fileno)
+        if target == subprocess.DEVNULL:
+            os.close(target_fileno)
+
+def wait_child(pid: int, timeout=None) -> int:
+    """Wait forked child and return its return code, like subprocess do.
+
+    Child is killed and subprocess.TimeoutExpired is raised after timeout seconds.
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    delay = 0.001
+    while True:
+        waited, status = os.waitpid(pid, os.WNOHANG if deadline is not None else 0)
+        if waited != 0:
+            break
+        if time.monotonic() >= deadline:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            raise subprocess.TimeoutExpired(JIT_PROGRAM_NAME, timeout)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
 # Create some useful types
 UCHAR_T = ir.IntType(16)
 USTR_T = ir.PointerType(UCHAR_T)
@@ -41,86 +185,489 @@ BBMAIN_SIGNATURE = ir.FunctionType(VOID_T, tuple())
 
 INT32_ZERO = ir.Constant(INT32_T, 0)
 
+class TargetOptions:
+
+    """Target machine options.
+
+    Default options describe baseline cpu for default triple.
+    Use TargetOptions.host() to tune code for current cpu (like -march=native).
+
+    >>> TargetOptions(cpu='haswell', features='+avx2,+fma').cpu
+    'haswell'
+    """
+
+    def __init__(self, triple=None, cpu='', features='',
+                 reloc='pic', codemodel='jitdefault', opt=2):
+        """See help(type(obj)).
+
+        reloc and codemodel are the same as for llvm TargetMachine,
+        opt is code generation optimization level (0-3).
+        Code is position independent by default, because executables
+        are PIE by default.
+        """
+        # TargetOptions is an options object, every option has default
+        #pylint: disable=too-many-arguments
+        self.triple = triple if triple is not None else binding.get_default_triple()
+        self.cpu = cpu
+        self.features = features
+        self.reloc = reloc
+        self.codemodel = codemodel
+        self.opt = opt
+
+    @classmethod
+    def host(cls, **kwargs):
+        """Return options for current cpu with all its features."""
+        initialize_llvm()
+        return cls(cpu=binding.get_host_cpu_name(),
+                   features=binding.get_host_cpu_features().flatten(),
+                   **kwargs)
+
+    def key(self) -> tuple:
+        """Return hashable options."""
+        return (self.triple, self.cpu, self.features, self.reloc, self.codemodel, self.opt)
+
+def create_target_machine(options: TargetOptions) -> binding.TargetMachine:
+    """Create new target machine for options."""
+    initialize_llvm()
+    target = binding.Target.from_triple(options.triple)
+    return target.create_target_machine(cpu=options.cpu, features=options.features,
+                                        opt=options.opt, reloc=options.reloc,
+                                        codemodel=options.codemodel)
+
+_TARGET_MACHINES = {}
+
+def get_target_machine(options: TargetOptions) -> binding.TargetMachine:
+    """Return target machine for options.
+
+    Target machines are created once and reused.
+    """
+    key = options.key()
+    if key not in _TARGET_MACHINES:
+        _TARGET_MACHINES[key] = create_target_machine(options)
+    return _TARGET_MACHINES[key]
+
+def parse_module(source: str, target_machine: binding.TargetMachine) -> binding.ModuleRef:
+    """Parse llvm ir and set target information, it enables cpu specific optimizations."""
+    llvm_module = binding.parse_assembly(source)
+    llvm_module.triple = target_machine.triple
+    llvm_module.data_layout = str(target_machine.target_data)
+    return llvm_module
+
+def _function_size(function: binding.ValueRef) -> int:
+    """Return count of function instructions."""
+    return sum(len(tuple(block.instructions)) for block in function.blocks)
+
+def partition_module(source: str, count: int) -> list:
+    """Split llvm module into at most count modules for separate compilation.
+
+    Defined functions are distributed between partitions by size and
+    global variables belong to the first partition. Every partition keeps
+    definitions of other symbols as available_externally, so they can be
+    inlined, but aren't emitted. Internal symbols are promoted to hidden
+    ones to be visible from other partitions.
+    Return list of partitions llvm ir.
+    """
+    initialize_llvm()
+    llvm_module = binding.parse_assembly(source)
+    functions = sorted((function for function in llvm_module.functions
+                        if not function.is_declaration),
+                       key=_function_size, reverse=True)
+    count = max(1, min(count, len(functions)))
+    if count == 1:
+        return [source]
+
+    # Largest functions first, every function goes to the smallest partition
+    owners = {variable.name: 0 for variable in llvm_module.global_variables
+              if not variable.is_declaration}
+    sizes = [0] * count
+    for function in functions:
+        partition = sizes.index(min(sizes))
+        owners[function.name] = partition
+        sizes[partition] += _function_size(function)
+
+    partitions = []
+    for partition in range(count):
+        partition_module_ref = binding.parse_assembly(source)
+        symbols = (tuple(partition_module_ref.functions) +
+                   tuple(partition_module_ref.global_variables))
+        for symbol in symbols:
+            if symbol.is_declaration:
+                continue
+            if symbol.linkage in (binding.Linkage.internal, binding.Linkage.private):
+                symbol.linkage = 'external'
+                symbol.visibility = 'hidden'
+            if owners[symbol.name] != partition:
+                symbol.linkage = 'available_externally'
+        partitions.append(str(partition_module_ref))
+    return partitions
+
+def emit_partition(source: str, pipeline, target: 'TargetOptions') -> bytes:
+    """Optimize partition and return object file content, runs in worker process."""
+    initialize_llvm()
+    target_machine = get_target_machine(target)
+    llvm_module = parse_module(source, target_machine)
+    llvm_module.verify()
+    pipeline.run(llvm_module, target_machine)
+    return target_machine.emit_object(llvm_module)
+
 class Backend:
 
     """Backend class: compile ast to llvm ir."""
 
-    def __init__(self):
-        """Init backend."""
+    # Backend is the compiler facade: it keeps compilation options and state
+    # and has a method for every kind of output
+    #pylint: disable=too-many-instance-attributes,too-many-public-methods
+
+    def __init__(self, entry_name=ENTRY_NAME):
+        """Init backend.
+
+        Program statements are compiled into entry_name function, it's
+        bbmain for main program and separate function for every included unit.
+        """
+        initialize_llvm()
         self.debug = False
+        self.jit = False
+        self.linker = 'cc'
+        self.lto = False
+        self.cache = None
+        self.target = TargetOptions()
+        self.pipeline = PIPELINES['balanced']
+        self.time_passes = False
+        self.pass_timings = None
+        self.codegen_jobs = 1
+
+        # Include path -> entry function of included unit and unit objects,
+        # with lto llvm ir of units is linked into module instead
+        self.includes = {}
+        self.unit_objects = []
+        self.unit_modules = []
+
+        # Optimized modules by (pipeline, lto, target) for self._optimized_source
+        self._optimized = {}
+        self._optimized_source = None
 
         # Create an empty module...
         self.source_module = ir.Module()
 
         self.init_runtime()
 
-        # and declare a function named "bbmain" inside it
-        bbmain = ir.Function(self.source_module, BBMAIN_SIGNATURE, name="bbmain")
+        # and declare entry function ("bbmain" for main program) inside it
+        entry = ir.Function(self.source_module, BBMAIN_SIGNATURE, name=entry_name)
 
-        # Now implement the function
-        block = bbmain.append_basic_block(name="entry")
+        # Now implement the function, statements are inserted before return
+        block = entry.append_basic_block(name="entry")
         self.builder = ir.IRBuilder(block)
+        self.builder.position_before(self.builder.ret_void())
 
-        """
-        python_string = 'Привет, Мир!\00'
-        ir_type = ir.ArrayType(UCHAR_T, len(python_string))
-        ir_const = ir.Constant.literal_array([ir.Constant(UCHAR_T, ord(symbol))
-                                              for symbol in python_string])
-        ir_global = ir.GlobalVariable(self.source_module, ir_type, 'hello')
-        ir_global.global_constant = True
-        ir_global.linkage = 'internal'
-        ir_global.initializer = ir_const
-        ir_global.align = 2
-
-        llvm_address = self.builder.gep(ir_global, (INT32_ZERO, INT32_ZERO), inbounds=True)
-        self.builder.call(self.runtime['Print'], (llvm_address, ))
-        """
-
-        self.builder.ret_void()
+        self.strings = {}
 
     def init_runtime(self):
         """Init runtime libraries."""
         self.runtime = {
-            'Print': ir.Function(self.source_module, ir.FunctionType(VOID_T, (USTR_T, )), 'Print')
+            'Print': ir.Function(self.source_module, ir.FunctionType(VOID_T, (USTR_T, )), 'Print'),
+            'Write': ir.Function(self.source_module, ir.FunctionType(VOID_T, (USTR_T, )), 'Write'),
         }
 
-    def optimize(self, opt_level=2) -> binding.ModuleRef:
-        """Compile and optimize llvm module."""
-        llvm_module = binding.parse_assembly(str(self.source_module))
+    def string_constant(self, value: str) -> ir.Value:
+        """Return pointer to null terminated utf-16 string constant."""
+        if value not in self.strings:
+            encoded = (value + '\0').encode('utf-16-le')
+            chars = [int.from_bytes(encoded[i:i + 2], 'little') for i in range(0, len(encoded), 2)]
+
+            ir_type = ir.ArrayType(UCHAR_T, len(chars))
+            ir_global = ir.GlobalVariable(self.source_module, ir_type,
+                                          self.source_module.get_unique_name('str'))
+            ir_global.global_constant = True
+            ir_global.linkage = 'internal'
+            ir_global.initializer = ir.Constant(ir_type, chars)
+            ir_global.align = 2
+            self.strings[value] = ir_global
+
+        return self.strings[value].gep((INT32_ZERO, INT32_ZERO))
+
+    def compile(self, program: ast.Program):
+        """Generate llvm ir for program statements into entry function."""
+        with phase('codegen'):
+            for statement in program['statements']:
+                self.compile_statement(statement)
+
+    def compile_statement(self, statement: ast.Statement):
+        """Generate llvm ir for statement."""
+        if isinstance(statement, ast.ProcedureCall):
+            name = statement['procedure']['name']
+            functions = {key.upper(): value for key, value in self.runtime.items()}
+            if name.upper() not in functions:
+                raise SyntaxError("Function '{name}' not found".format(name=name))
+
+            function = functions[name.upper()]
+            if len(statement['args']) != len(function.args):
+                raise SyntaxError("Function '{name}' takes {count} arguments"
+                                  .format(name=name, count=len(function.args)))
+            args = tuple(self.compile_expression(arg) for arg in statement['args'])
+            self.builder.call(function, args)
+        elif isinstance(statement, ast.Include):
+            if statement['path'] not in self.includes:
+                raise SyntaxError("Include '{path}' is not resolved"
+                                  .format(path=statement['path']))
+            entry_name = self.includes[statement['path']]
+            function = self.source_module.globals.get(entry_name)
+            if function is None:
+                function = ir.Function(self.source_module, BBMAIN_SIGNATURE, name=entry_name)
+            self.builder.call(function, ())
+        elif isinstance(statement, ast.Literal):
+            # Literal has no side effects
+            pass
+        else:
+            raise NotImplementedError("Statement '{statement}' is not supported yet"
+                                      .format(statement=statement))
+
+    def compile_expression(self, expression: ast.Expression) -> ir.Value:
+        """Generate llvm ir for expression and return its value."""
+        if isinstance(expression, ast.StrLiteral):
+            return self.string_constant(expression['value'])
+
+        raise NotImplementedError("Expression '{expression}' is not supported yet"
+                                  .format(expression=expression))
+
+    def get_pipeline(self, opt_level=None):
+        """Return self.pipeline with opt_level, if it's set."""
+        if opt_level is None:
+            return self.pipeline
+        return self.pipeline.replace(opt_level=opt_level)
+
+    def cache_key(self, opt_level=None, source=None) -> str:
+        """Return cache key for artifacts of current module."""
+        if source is None:
+            source = str(self.source_module)
+        return make_key(source, *self.unit_modules,
+                        repr(self.get_pipeline(opt_level).key()), str(self.debug),
+                        str(self.lto), repr(self.target.key()), runtime_version())
+
+    def optimize(self, opt_level=None) -> binding.ModuleRef:
+        """Compile and optimize llvm module.
+
+        Module is optimized with self.pipeline, opt_level overrides its
+        optimization level.
+        If self.time_passes is set, self.pass_timings is filled with
+        timings of pipeline stages and passes.
+        If self.lto is set, included units (self.unit_modules) and runtime
+        bitcode are linked into module before optimization.
+        Optimized module is memoized until source module is changed,
+        so it's shared between calls and shouldn't be modified.
+        Optimized bitcode is taken from self.cache, if it's set.
+        """
+        with phase('optimize'):
+            return self._memoized_optimize(opt_level)
+
+    def _memoized_optimize(self, opt_level) -> binding.ModuleRef:
+        """Compile and optimize llvm module with memoization."""
+        source = str(self.source_module)
+        if (source, self.unit_modules) != self._optimized_source:
+            self._optimized = {}
+            self._optimized_source = (source, list(self.unit_modules))
+
+        memo_key = self._memo_key(opt_level)
+        if memo_key in self._optimized:
+            return self._optimized[memo_key]
+
+        llvm_module = self._optimize(source, opt_level)
+        self._optimized[memo_key] = llvm_module
+        return llvm_module
+
+    def _memo_key(self, opt_level) -> tuple:
+        """Return key of optimized module in self._optimized."""
+        return (self.get_pipeline(opt_level).key(), self.lto, self.target.key())
+
+    def load_optimized(self, bitcode: bytes):
+        """Use optimized module from bitcode instead of optimizing source module.
+
+        Bitcode should be optimized with the same options by other backend
+        (for example, by compiler daemon).
+        """
+        self._optimized_source = (str(self.source_module), list(self.unit_modules))
+        self._optimized = {self._memo_key(None): binding.parse_bitcode(bitcode)}
+
+    def _optimize(self, source: str, opt_level) -> binding.ModuleRef:
+        """Compile and optimize llvm module without memoization."""
+        if self.cache is not None:
+            key = self.cache_key(opt_level, source)
+            bitcode = self.cache.load(key, 'bc')
+            if bitcode is not None:
+                return binding.parse_bitcode(bitcode)
+
+        target_machine = self.get_target_machine()
+        llvm_module = parse_module(source, target_machine)
+
+        if self.lto:
+            for unit_source in self.unit_modules:
+                llvm_module.link_in(parse_module(unit_source, target_machine))
+            link_runtime(llvm_module)
         llvm_module.verify()
 
         # Optimize
-        pass_manager = binding.create_module_pass_manager()
-        pass_manager_builder = binding.create_pass_manager_builder()
-        pass_manager_builder.opt_level = opt_level
-        pass_manager_builder.populate(pass_manager)
-        pass_manager.run(llvm_module)
+        pipeline = self.get_pipeline(opt_level)
+        if self.lto and pipeline.opt_level > 0 and pipeline.inlining_threshold is None:
+            # Inline runtime helpers into user code
+            pipeline = pipeline.replace(inlining_threshold=LTO_INLINING_THRESHOLD)
+        timings = pipeline.run(llvm_module, target_machine, time_passes=self.time_passes)
+        if self.time_passes:
+            self.pass_timings = timings
+
+        if self.cache is not None:
+            self.cache.store(key, 'bc', llvm_module.as_bitcode())
 
         return llvm_module
 
-    @staticmethod
-    def get_target_machine():
-        """Return current target machine."""
-        return binding.Target.from_default_triple().create_target_machine()
+    def get_target_machine(self) -> binding.TargetMachine:
+        """Return target machine for self.target options."""
+        return get_target_machine(self.target)
 
     def emit_assembly(self) -> str:
         """Optimize and return target assembler."""
-        llvm_module = self.optimize()
+        # Code generation modifies module, memoized one is kept intact
+        llvm_module = self.optimize().clone()
         target_machine = self.get_target_machine()
 
-        return target_machine.emit_assembly(llvm_module)
+        with phase('emit_assembly'):
+            return target_machine.emit_assembly(llvm_module)
 
     def emit_llvm(self) -> str:
         """Optimize and return llvm ir."""
         llvm_module = self.optimize()
         return str(llvm_module)
 
+    def emit_object(self) -> bytes:
+        """Optimize and return object file content."""
+        if self.cache is not None:
+            key = self.cache_key()
+            obj = self.cache.load(key, 'o')
+            if obj is not None:
+                return obj
+
+        llvm_module = self.optimize().clone()
+        target_machine = self.get_target_machine()
+        with phase('emit_object'):
+            obj = target_machine.emit_object(llvm_module)
+
+        if self.cache is not None:
+            self.cache.store(key, 'o', obj)
+
+        return obj
+
+    def emit_objects(self) -> list:
+        """Optimize and return list of object files content.
+
+        If self.codegen_jobs is greater than one, module is split by
+        partition_module and partitions are optimized and emitted in
+        parallel worker processes. Partition objects are cached separately,
+        so unchanged functions aren't recompiled.
+        Runtime is linked into whole module with lto, so lto disables
+        partitioning.
+        """
+        if self.codegen_jobs <= 1 or self.lto:
+            return [self.emit_object()]
+
+        import concurrent.futures #pylint: disable=import-outside-toplevel
+
+        with phase('partition'):
+            partitions = partition_module(str(self.source_module), self.codegen_jobs)
+        if len(partitions) == 1:
+            return [self.emit_object()]
+
+        objects = [None] * len(partitions)
+        keys = [None] * len(partitions)
+        if self.cache is not None:
+            for index, partition in enumerate(partitions):
+                keys[index] = self.cache_key(source=partition)
+                objects[index] = self.cache.load(keys[index], 'o')
+
+        missing = [index for index, obj in enumerate(objects) if obj is None]
+        if not missing:
+            return objects
+
+        with phase('emit_partitions'), \
+             concurrent.futures.ProcessPoolExecutor(min(len(missing), self.codegen_jobs)) \
+             as executor:
+            futures = {executor.submit(emit_partition, partitions[index], self.pipeline,
+                                       self.target): index
+                       for index in missing}
+            for future in concurrent.futures.as_completed(futures):
+                index = futures[future]
+                objects[index] = future.result()
+                if self.cache is not None:
+                    self.cache.store(keys[index], 'o', objects[index])
+
+        return objects
+
+    def program_objects(self) -> list:
+        """Return objects of program and included units to link."""
+        return self.emit_objects() + list(self.unit_objects)
+
+    def derive(self, entry_name: str):
+        """Return empty backend with the same options for other compilation unit."""
+        backend = type(self)(entry_name)
+        for name in ('debug', 'jit', 'linker', 'lto', 'cache', 'target', 'pipeline',
+                     'codegen_jobs'):
+            setattr(backend, name, getattr(self, name))
+        return backend
+
+    def can_link_directly(self) -> bool:
+        """Check that prebuilt runtime and linker are available."""
+        return (shutil.which(self.linker) is not None and
+                all((SOURCE_DIRECTORY / name).exists() for name in RUNTIME_STATIC))
+
+    def link_executable(self, object_filenames, executable_filename: str):
+        """Link object files with prebuilt runtime by single linker call."""
+        # Runtime is already inside objects with lto
+        runtime = ICU_STATIC if self.lto else RUNTIME_STATIC
+        linker_args = (
+            tuple(str(filename) for filename in object_filenames) +
+            tuple(str(SOURCE_DIRECTORY / name) for name in runtime) +
+            SYSTEM_LIBRARIES
+        )
+        if not self.debug:
+            linker_args += ('-s', )
+
+        with phase('link'):
+            subprocess.run((self.linker, '-o', str(executable_filename)) + linker_args,
+                           stdout=sys.stdout.fileno(), stderr=sys.stderr.fileno(),
+                           check=True)
+
     def emit_executable(self, executable_filename: str):
-        """Create executable file."""
+        """Create executable file.
+
+        Object file is linked directly with prebuilt runtime if it's
+        possible, else program is built with cmake.
+        Executable is taken from self.cache, if it's set.
+        """
+        if self.cache is not None:
+            key = self.cache_key()
+            if self.cache.copy(key, 'exe', executable_filename):
+                return
+
+        if not self.can_link_directly():
+            self.emit_executable_cmake(executable_filename)
+        else:
+            with tempfile.TemporaryDirectory() as build_dir:
+                object_filenames = []
+                for index, obj in enumerate(self.program_objects()):
+                    object_filename = pathlib.Path(build_dir) / '{index}.{name}'.format(
+                        index=index, name=OBJECT_FILENAME)
+                    object_filename.write_bytes(obj)
+                    object_filenames.append(object_filename)
+                self.link_executable(object_filenames, executable_filename)
+
+        if self.cache is not None:
+            self.cache.store_file(key, 'exe', executable_filename)
+
+    def emit_executable_cmake(self, executable_filename: str):
+        """Create executable file with cmake."""
         with tempfile.TemporaryDirectory() as source_dir:
             source_dir = pathlib.Path(source_dir)
             with open(source_dir / SOURCE_FILENAME, 'w') as output:
                 output.write(self.emit_assembly())
+            for index, obj in enumerate(self.unit_objects):
+                (source_dir / 'unit{index}.o'.format(index=index)).write_bytes(obj)
             for filename in glob.iglob(str(SOURCE_DIRECTORY / '*')):
                 shutil.copy2(filename, str(source_dir))
 
@@ -139,22 +686,136 @@ class Backend:
                 '--config', config
             )
 
-            subprocess.run(('cmake', '..') + cmake_args,
-                           stdout=sys.stdout.fileno(), stderr=sys.stderr.fileno(),
-                           cwd=build_dir, check=True)
-            subprocess.run(('cmake', '--build', '.') + build_args,
-                           stdout=sys.stdout.fileno(), stderr=sys.stderr.fileno(),
-                           cwd=build_dir, check=True)
+            with phase('cmake'):
+                subprocess.run(('cmake', '..') + cmake_args,
+                               stdout=sys.stdout.fileno(), stderr=sys.stderr.fileno(),
+                               cwd=build_dir, check=True)
+                subprocess.run(('cmake', '--build', '.') + build_args,
+                               stdout=sys.stdout.fileno(), stderr=sys.stderr.fileno(),
+                               cwd=build_dir, check=True)
 
             shutil.copy2(build_dir / EXECUTABLE_FILENAME, executable_filename)
 
-    def run(self, *args, check=True, **kwargs) -> subprocess.CompletedProcess:
+    def create_execution_engine(self) -> binding.ExecutionEngine:
+        """Create MCJIT execution engine with optimized module.
+
+        bbruntime is loaded into current process to resolve runtime calls.
+        """
+        load_runtime()
+        # Execution engine takes ownership of module and target machine
+        llvm_module = self.optimize().clone()
+        options = self.target
+        if self.unit_objects:
+            # Jit object loader doesn't support large code model of jit default,
+            # so module is linked with unit objects in small code model
+            options = TargetOptions(options.triple, options.cpu, options.features,
+                                    options.reloc, 'small', options.opt)
+        target_machine = create_target_machine(options)
+
+        engine = binding.create_mcjit_compiler(llvm_module, target_machine)
+        for obj in self.unit_objects:
+            engine.add_object_file(binding.ObjectFileRef.from_data(obj))
+        engine.finalize_object()
+        engine.run_static_constructors()
+        return engine
+
+    def run_jit(self, *args, check=True, isolate=True, stdin=None, input=None,
+                stdout=None, stderr=None, encoding=None, timeout=None, cwd=None,
+                env=None) -> subprocess.CompletedProcess:
+        """Run program in-process with MCJIT.
+
+        Return completed process, like run do.
+        With isolate program is executed in a forked child, so runtime
+        crashes and exits doesn't affect current process.
+        stdin, input, stdout, stderr, encoding, timeout, cwd and env are
+        the same as for subprocess.run, timeout, cwd and env need isolate.
+        args are only stored in completed process, because runtime doesn't
+        read command line.
+        """
+        #pylint: disable=too-many-arguments,too-many-locals,too-many-branches,redefined-builtin
+        if input is not None:
+            if stdin is not None:
+                raise ValueError('stdin and input arguments may not both be used')
+            stdin = subprocess.PIPE
+            if encoding is not None:
+                input = input.encode(encoding)
+        if not isolate and (timeout, cwd, env) != (None, None, None):
+            raise ValueError('timeout, cwd and env need isolated run')
+
+        engine = self.create_execution_engine()
+        if self.lto:
+            # bbinit and bbmain are internalized, runtime main calls them
+            entries = (ctypes.CFUNCTYPE(ctypes.c_int)(engine.get_function_address('main')), )
+        else:
+            entries = (ctypes.CFUNCTYPE(None)(binding.address_of_symbol('bbinit')),
+                       ctypes.CFUNCTYPE(None)(engine.get_function_address(ENTRY_NAME)))
+
+        with tempfile.TemporaryFile() as stdin_file, \
+             tempfile.TemporaryFile() as stdout_file, tempfile.TemporaryFile() as stderr_file:
+            if input is not None:
+                stdin_file.write(input)
+                stdin_file.seek(0)
+
+            def execute():
+                with redirect_fd(STDIN_FILENO, stdin, stdin_file), \
+                     redirect_fd(STDOUT_FILENO, stdout, stdout_file), \
+                     redirect_fd(STDERR_FILENO, stderr, stderr_file):
+                    for entry in entries:
+                        entry()
+
+            if isolate:
+                pid = os.fork()
+                if pid == 0:
+                    exit_code = 1
+                    try:
+                        if cwd is not None:
+                            os.chdir(cwd)
+                        if env is not None:
+                            os.environ.clear()
+                            os.environ.update(env)
+                        execute()
+                        exit_code = 0
+                    finally:
+                        os._exit(exit_code) #pylint: disable=protected-access
+                returncode = wait_child(pid, timeout)
+            else:
+                execute()
+                returncode = 0
+
+            outputs = []
+            for target, output_file in ((stdout, stdout_file), (stderr, stderr_file)):
+                if target != subprocess.PIPE:
+                    outputs.append(None)
+                    continue
+                output_file.seek(0)
+                output = output_file.read()
+                outputs.append(output.decode(encoding) if encoding is not None else output)
+
+        completed = subprocess.CompletedProcess(args=(JIT_PROGRAM_NAME, ) + args,
+                                                returncode=returncode,
+                                                stdout=outputs[0], stderr=outputs[1])
+        if check:
+            completed.check_returncode()
+        return completed
+
+    def run(self, *args, check=True, jit=None, **kwargs) -> subprocess.CompletedProcess:
         """Run program in a subprocess.
 
         Return completed process.
         All keyword arguments pass to subprocess.run.
         check is set to True by default.
+        If jit (self.jit by default) is set, program is executed with run_jit,
+        it supports only JIT_RUN_OPTIONS arguments.
         """
+        if jit is None:
+            jit = self.jit
+        if jit:
+            unsupported = sorted(set(kwargs) - set(JIT_RUN_OPTIONS))
+            if unsupported:
+                raise TypeError('Arguments {names} are not supported with jit'
+                                .format(names=', '.join(unsupported)))
+            return self.run_jit(*args, check=check, **kwargs)
+
         with tempfile.NamedTemporaryFile() as executable_file:
             executable_filename = executable_file.name
             executable_file.close()
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+"""Content-addressed on-disk cache for llb3d compiler.
+
+Cache store compilation artifacts (optimized bitcode, objects, executables)
+by key, that is a hash of everything, that affects the artifact.
+"""
+
+import os
+import pathlib
+import hashlib
+import shutil
+import tempfile
+
+DEFAULT_MAX_SIZE = 1024 ** 3
+
+def default_cache_directory() -> pathlib.Path:
+    """Return llb3d directory inside XDG cache directory."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or pathlib.Path.home() / '.cache'
+    return pathlib.Path(cache_home) / 'llb3d'
+
+def make_key(*parts) -> str:
+    """Return hash of str or bytes parts.
+
+    >>> make_key('a', 'bc') == make_key('a', 'bc')
+    True
+    >>> make_key('a', 'bc') == make_key('ab', 'c')
+    False
+    """
+    hasher = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        hasher.update(len(part).to_bytes(8, 'little'))
+        hasher.update(part)
+    return hasher.hexdigest()
+
+class CompilationCache:
+
+    """On-disk cache with LRU size-based eviction.
+
+    Every entry is a file, addressed by key and kind (file extension).
+    Access time is tracked with file modification time.
+    Cache can be shared between processes, so entry can be evicted by
+    other process at any time; vanished entry is a cache miss.
+    Total size is counted on the first store and then tracked, so the
+    directory is scanned again only when the size is over max_size.
+
+    >>> cache = CompilationCache(tempfile.mkdtemp())
+    >>> key = make_key('Print "Hello"')
+    >>> cache.load(key, 'o') is None
+    True
+    >>> path = cache.store(key, 'o', b'object')
+    >>> cache.load(key, 'o')
+    b'object'
+    >>> cache.hits, cache.misses
+    (1, 1)
+    """
+
+    def __init__(self, directory=None, max_size: int = DEFAULT_MAX_SIZE):
+        """See help(type(obj))."""
+        if directory is None:
+            directory = default_cache_directory()
+        self.directory = pathlib.Path(directory)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # Estimated total size of entries, None if it isn't counted yet
+        self._size = None
+
+    def path(self, key: str, kind: str) -> pathlib.Path:
+        """Return path to entry."""
+        return self.directory / key[:2] / '{key}.{kind}'.format(key=key, kind=kind)
+
+    def lookup(self, key: str, kind: str):
+        """Return path to entry or None if cache miss."""
+        path = self.path(key, kind)
+        try:
+            os.utime(str(path))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return path
+
+    def _vanished(self):
+        """Count hit of entry, that is removed before reading, as miss."""
+        self.hits -= 1
+        self.misses += 1
+
+    def load(self, key: str, kind: str):
+        """Return entry content or None if cache miss."""
+        path = self.lookup(key, kind)
+        if path is None:
+            return None
+
+        try:
+            with open(path, 'rb') as entry:
+                return entry.read()
+        except FileNotFoundError:
+            self._vanished()
+            return None
+
+    def copy(self, key: str, kind: str, filename) -> bool:
+        """Copy entry (with permissions) to filename.
+
+        Return False if cache miss.
+        """
+        path = self.lookup(key, kind)
+        if path is None:
+            return False
+
+        try:
+            shutil.copy2(str(path), str(filename))
+        except FileNotFoundError:
+            self._vanished()
+            return False
+        return True
+
+    def _commit(self, key: str, kind: str, write) -> pathlib.Path:
+        """Atomically create entry with write(temporary_filename)."""
+        path = self.path(key, kind)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        descriptor, temporary_filename = tempfile.mkstemp(dir=str(path.parent))
+        os.close(descriptor)
+        try:
+            write(temporary_filename)
+            size = os.stat(temporary_filename).st_size
+            os.replace(temporary_filename, str(path))
+        except BaseException:
+            os.unlink(temporary_filename)
+            raise
+
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += size
+        if self._size > self.max_size:
+            self.evict()
+        return path
+
+    def store(self, key: str, kind: str, data: bytes) -> pathlib.Path:
+        """Store entry content and return path to entry."""
+        def write(filename):
+            with open(filename, 'wb') as entry:
+                entry.write(data)
+
+        return self._commit(key, kind, write)
+
+    def store_file(self, key: str, kind: str, filename) -> pathlib.Path:
+        """Store file (with permissions) and return path to entry."""
+        return self._commit(key, kind,
+                            lambda temporary_filename: shutil.copy2(str(filename),
+                                                                    temporary_filename))
+
+    def entries(self):
+        """Return list of (modification time, size, path) sorted by time."""
+        result = []
+        for path in self.directory.glob('*/*.*'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            result.append((stat.st_mtime, stat.st_size, path))
+
+        result.sort()
+        return result
+
+    def size(self) -> int:
+        """Return total size of entries."""
+        return sum(size for _mtime, size, _path in self.entries())
+
+    def evict(self):
+        """Remove least recently used entries, while cache is too big."""
+        entries = self.entries()
+        total_size = sum(size for _mtime, size, _path in entries)
+        for _mtime, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total_size -= size
+        self._size = total_size
+
+    def clear(self):
+        """Remove all entries."""
+        for *_, path in self.entries():
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        self._size = 0
+
+    def stats(self) -> dict:
+        """Return hit/miss statistics."""
+        entries = self.entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(entries),
+            'size': sum(size for _mtime, size, _path in entries),
+        }
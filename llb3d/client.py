@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""Client of llb3d compiler daemon.
+
+Protocol is newline delimited json over Unix socket: client sends request
+objects and gets response object for every request.
+
+Requests:
+
+    {"command": "ping"}
+    {"command": "build", "source": path, "output": path or null,
+     "emit": "exe", "options": {...}}
+    {"command": "compile", "source": path, "directory": path, "jit": false,
+     "options": {...}}
+    {"command": "shutdown"}
+
+Paths are absolute, options are keyword arguments of driver.create_backend
+and validate flag. Response has "status" equal to "ok" or "error", error
+response has error "type" and "message".
+
+compile request writes program into directory and returns "executable"
+path or, with jit, "bitcode" of optimized module and "unit_objects" paths.
+Program is run by client, so it gets client cwd, environment, stdio and
+signals, and daemon isn't blocked by long running programs.
+
+Module is imported by every command line call, so it must be cheap.
+"""
+
+import os
+import json
+import socket
+import pathlib
+import tempfile
+
+from .version import VERSION
+
+SOCKET_NAME = 'llb3d.sock'
+
+def default_socket_path() -> pathlib.Path:
+    """Return socket path inside XDG runtime directory or temporary directory."""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return pathlib.Path(runtime_dir) / SOCKET_NAME
+    return pathlib.Path(tempfile.gettempdir()) / 'llb3d-{uid}.sock'.format(uid=os.getuid())
+
+class Client:
+
+    """Daemon client."""
+
+    def __init__(self, path=None, timeout=None):
+        """See help(type(obj))."""
+        self.path = pathlib.Path(path) if path is not None else default_socket_path()
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        try:
+            self.socket.connect(str(self.path))
+        except OSError:
+            self.socket.close()
+            raise
+        self.stream = self.socket.makefile('rwb')
+
+    def request(self, command: str, **fields) -> dict:
+        """Send request and return response."""
+        fields['command'] = command
+        self.stream.write(json.dumps(fields).encode('utf-8') + b'\n')
+        self.stream.flush()
+        line = self.stream.readline()
+        if not line:
+            raise ConnectionError('Daemon closed connection')
+        return json.loads(line.decode('utf-8'))
+
+    def close(self):
+        """Close connection."""
+        self.stream.close()
+        self.socket.close()
+
+    def __enter__(self):
+        """See help(type(obj))."""
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        """See help(type(obj))."""
+        self.close()
+
+def connect(path=None):
+    """Return client of running daemon of the same version or None."""
+    try:
+        client = Client(path)
+    except OSError:
+        return None
+
+    try:
+        response = client.request('ping')
+    except (OSError, ValueError):
+        response = {}
+
+    if response.get('version') != VERSION:
+        client.close()
+        return None
+    return client
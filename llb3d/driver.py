@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""Compiler driver: source code to llvm ir, assembler, objects and executables."""
+
+import os
+import pathlib
+import tempfile
+import collections
+
+from . import ast, units
+from .backend import Backend, TargetOptions
+from .cache import CompilationCache
+from .pipeline import PIPELINES
+
+EMIT_SUFFIXES = {
+    'exe': '',
+    'asm': '.s',
+    'llvm': '.ll',
+    'obj': '.o',
+}
+
+def create_backend(pipeline='balanced', native=False, lto=False, debug=False,
+                   cache=False, cache_dir=None, codegen_jobs=1) -> Backend:
+    """Create backend with options, the same as command line ones."""
+    # Options mirror command line, every option has default
+    #pylint: disable=too-many-arguments
+    backend = Backend()
+    backend.debug = debug
+    backend.lto = lto
+    backend.pipeline = PIPELINES[pipeline]
+    backend.codegen_jobs = codegen_jobs
+    if native:
+        backend.target = TargetOptions.host()
+    if cache:
+        backend.cache = CompilationCache(cache_dir)
+    return backend
+
+def compile_source(code: str, backend: Backend = None, directory='.') -> Backend:
+    """Compile source code into backend.
+
+    Included files are searched in directory and compiled separately
+    (see units module).
+    Return backend with generated llvm ir.
+    """
+    if backend is None:
+        backend = Backend()
+
+    return units.compile_unit(units.load_unit(code, directory, backend.cache), backend)
+
+def output_filename(filename, emit_type: str) -> pathlib.Path:
+    """Return default output filename for source filename.
+
+    >>> str(output_filename('game/main.bb', 'asm'))
+    'game/main.s'
+    """
+    return pathlib.Path(filename).with_suffix(EMIT_SUFFIXES[emit_type])
+
+def emit(backend: Backend, emit_type: str, output):
+    """Write backend output of emit_type (see EMIT_SUFFIXES) to output file."""
+    if emit_type == 'exe':
+        backend.emit_executable(output)
+    elif emit_type == 'obj':
+        with open(output, 'wb') as output_file:
+            output_file.write(backend.emit_object())
+    else:
+        text = backend.emit_assembly() if emit_type == 'asm' else backend.emit_llvm()
+        with open(output, 'w') as output_file:
+            output_file.write(text)
+
+def build(filename, output=None, emit_type='exe', backend: Backend = None) -> pathlib.Path:
+    """Compile source file and write output of emit_type.
+
+    Return output filename.
+    """
+    if output is None:
+        output = output_filename(filename, emit_type)
+
+    with open(filename, encoding='utf-8') as source:
+        code = source.read()
+
+    backend = compile_source(code, backend, pathlib.Path(filename).parent)
+    emit(backend, emit_type, output)
+    return pathlib.Path(output)
+
+BuildResult = collections.namedtuple('BuildResult', ('source', 'output', 'error'))
+
+def _build_worker(filename, emit_type: str, output, options: dict, validate: bool):
+    """Compile source file in worker process.
+
+    Return object files content, if executable should be linked by caller,
+    else write output and return None.
+    """
+    ast.set_validation(validate)
+    backend = create_backend(**options)
+    with open(filename, encoding='utf-8') as source:
+        compile_source(source.read(), backend, pathlib.Path(filename).parent)
+
+    if emit_type == 'exe' and backend.can_link_directly():
+        return backend.program_objects()
+    emit(backend, emit_type, output)
+    return None
+
+def _submit_builds(executor, filenames, emit_type: str, options: dict, validate: bool) -> dict:
+    """Submit build of every source file to executor.
+
+    Return dict of futures to source index, filename and output filename.
+    """
+    futures = {}
+    for index, filename in enumerate(filenames):
+        output = output_filename(filename, emit_type)
+        future = executor.submit(_build_worker, filename, emit_type, output, options, validate)
+        futures[future] = (index, filename, output)
+    return futures
+
+def _link_objects(linker: Backend, objects, object_prefix: pathlib.Path, output):
+    """Write objects content into files with object_prefix and link executable."""
+    object_filenames = []
+    for number, obj in enumerate(objects):
+        object_filename = object_prefix.with_name('{prefix}.{number}.o'.format(
+            prefix=object_prefix.name, number=number))
+        object_filename.write_bytes(obj)
+        object_filenames.append(object_filename)
+    linker.link_executable(object_filenames, output)
+
+def _build_result(future, linker: Backend, object_prefix: pathlib.Path,
+                  filename, output) -> BuildResult:
+    """Link objects of finished worker, if needed, and return BuildResult."""
+    try:
+        objects = future.result()
+        if objects is not None:
+            _link_objects(linker, objects, object_prefix, output)
+    except SyntaxError as error:
+        return BuildResult(filename, None, error.msg)
+    except Exception as error: #pylint: disable=broad-except
+        return BuildResult(filename, None, '{type}: {error}'.format(
+            type=type(error).__name__, error=error))
+    return BuildResult(filename, pathlib.Path(output), None)
+
+def build_many(filenames, emit_type='exe', options=None, jobs=None, validate=False):
+    """Build many source files in process pool of jobs workers.
+
+    Programs are compiled to objects in workers and linked in current
+    process. options are create_backend keyword arguments.
+    Yield BuildResult with output filename or error message for every
+    source file as soon as it's built.
+    """
+    import concurrent.futures #pylint: disable=import-outside-toplevel
+
+    if options is None:
+        options = {}
+    if jobs is None:
+        jobs = os.cpu_count()
+    linker = create_backend(**options)
+
+    with tempfile.TemporaryDirectory() as build_dir, \
+         concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        futures = _submit_builds(executor, filenames, emit_type, options, validate)
+        for future in concurrent.futures.as_completed(futures):
+            index, filename, output = futures[future]
+            yield _build_result(future, linker, pathlib.Path(build_dir) / str(index),
+                                filename, output)
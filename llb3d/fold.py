@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+"""Constant folding for llb3d AST.
+
+Expressions of literals and Const bindings are evaluated before codegen
+with Blitz3D semantics: Int is int32 with wraparound, Float is float32,
+Int operands of Float operations are converted to Float, ^ is always Float
+and comparisons give Int 1 or 0. Expressions, that fail at runtime
+(division by zero and so on), are left as is.
+
+>>> from .ast import BinaryOp, IntLiteral
+>>> fold_constants(BinaryOp('*', IntLiteral(65536), IntLiteral(65536)))
+IntLiteral(0)
+>>> fold_constants(BinaryOp('/', IntLiteral(-7), IntLiteral(2)))
+IntLiteral(-3)
+"""
+
+import math
+import operator
+import struct
+
+from . import ast
+from .visitor import NodeTransformer
+
+def wrap_int(value: int) -> int:
+    """Wrap integer into int32.
+
+    >>> wrap_int(2 ** 31)
+    -2147483648
+    """
+    return (value + 2 ** 31) % 2 ** 32 - 2 ** 31
+
+def round_float(value: float) -> float:
+    """Round value to float32.
+
+    >>> round_float(0.1)
+    0.10000000149011612
+    """
+    return struct.unpack('f', struct.pack('f', value))[0]
+
+INT_MIN = -2 ** 31
+
+def _check_int_division(left, right):
+    """Raise ArithmeticError for INT_MIN / -1, it traps at runtime."""
+    if wrap_int(left) == INT_MIN and wrap_int(right) == -1:
+        raise OverflowError('Integer division overflow')
+
+def _int_div(left, right):
+    """Divide with truncation to zero, like cpu does."""
+    _check_int_division(left, right)
+    quotient = abs(left) // abs(right)
+    return quotient if (left < 0) == (right < 0) else -quotient
+
+def _int_mod(left, right):
+    """Return remainder with sign of dividend."""
+    _check_int_division(left, right)
+    remainder = abs(left) % abs(right)
+    return -remainder if left < 0 else remainder
+
+INT_OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': _int_div,
+    'MOD': _int_mod,
+    'SHL': lambda left, right: left << (right & 31),
+    'SHR': lambda left, right: (left & 0xffffffff) >> (right & 31),
+    'SAR': lambda left, right: left >> (right & 31),
+    'AND': operator.and_,
+    'OR': operator.or_,
+    'XOR': operator.xor,
+}
+
+FLOAT_OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    'MOD': math.fmod,
+    '^': math.pow,
+}
+
+COMPARISONS = {
+    '=': operator.eq,
+    '<>': operator.ne,
+    '<': operator.lt,
+    '>': operator.gt,
+    '<=': operator.le,
+    '>=': operator.ge,
+}
+
+UNARY_OPERATORS = {
+    ('-', ast.IntLiteral): lambda value: ast.IntLiteral(wrap_int(-value)),
+    ('-', ast.FloatLiteral): lambda value: ast.FloatLiteral(-value),
+    ('+', ast.IntLiteral): ast.IntLiteral,
+    ('+', ast.FloatLiteral): ast.FloatLiteral,
+    ('~', ast.IntLiteral): lambda value: ast.IntLiteral(wrap_int(~value)),
+    ('NOT', ast.IntLiteral): lambda value: ast.IntLiteral(int(value == 0)),
+    ('NOT', ast.FloatLiteral): lambda value: ast.IntLiteral(int(value == 0)),
+}
+
+def _float_value(literal: ast.Literal) -> float:
+    """Return numeric literal value as float32."""
+    return round_float(float(literal['value']))
+
+def fold_binary(op: str, left: ast.Literal, right: ast.Literal) -> ast.Literal:
+    """Return literal with value of binary operation or None, if it can't be folded."""
+    #pylint: disable=too-many-return-statements,invalid-name
+    op = op.upper()
+    left_type, right_type = type(left), type(right)
+
+    if ast.StrLiteral in (left_type, right_type):
+        if op == '+' and left_type is ast.StrLiteral and right_type is not ast.FloatLiteral:
+            return ast.StrLiteral(left['value'] + str(right['value']))
+        if op in COMPARISONS and left_type is right_type:
+            return ast.IntLiteral(int(COMPARISONS[op](left['value'], right['value'])))
+        return None
+
+    if op in COMPARISONS:
+        if left_type is right_type is ast.IntLiteral:
+            return ast.IntLiteral(int(COMPARISONS[op](left['value'], right['value'])))
+        return ast.IntLiteral(int(COMPARISONS[op](_float_value(left), _float_value(right))))
+
+    try:
+        if left_type is right_type is ast.IntLiteral and op in INT_OPERATORS:
+            return ast.IntLiteral(wrap_int(INT_OPERATORS[op](left['value'], right['value'])))
+        if op in FLOAT_OPERATORS:
+            value = FLOAT_OPERATORS[op](_float_value(left), _float_value(right))
+            return ast.FloatLiteral(round_float(value))
+    except (ArithmeticError, ValueError):
+        pass
+    return None
+
+def fold_unary(op: str, right: ast.Literal) -> ast.Literal:
+    """Return literal with value of unary operation or None, if it can't be folded."""
+    #pylint: disable=invalid-name
+    fold = UNARY_OPERATORS.get((op.upper(), type(right)))
+    if fold is None:
+        return None
+    return fold(right['value'])
+
+class ConstantFolder(NodeTransformer):
+
+    """Fold constant expressions.
+
+    constants maps Const names to literals, names are case insensitive.
+
+    >>> from .ast import BinaryOp, Identifier, IntLiteral, StrLiteral
+    >>> folder = ConstantFolder({'Width': IntLiteral(640)})
+    >>> folder.visit(BinaryOp('+', StrLiteral('w='), Identifier('width')))
+    StrLiteral('w=640')
+    """
+
+    def __init__(self, constants=None):
+        """Initialize self.  See help(type(self)) for accurate signature."""
+        self.constants = {name.lower(): value for name, value in (constants or {}).items()}
+
+    def value(self, expression: ast.Expression) -> ast.Expression:
+        """Return literal for Const name or expression itself."""
+        if isinstance(expression, ast.Identifier):
+            return self.constants.get(expression['name'].lower(), expression)
+        return expression
+
+    def visit_UnaryOp(self, node): #pylint: disable=invalid-name
+        """Fold unary operator."""
+        right = self.value(node['right'])
+        if isinstance(right, ast.Literal):
+            result = fold_unary(node['op'], right)
+            if result is not None:
+                return result
+        return node
+
+    def visit_BinaryOp(self, node): #pylint: disable=invalid-name
+        """Fold binary operator."""
+        left, right = self.value(node['left']), self.value(node['right'])
+        if isinstance(left, ast.Literal) and isinstance(right, ast.Literal):
+            result = fold_binary(node['op'], left, right)
+            if result is not None:
+                return result
+        return node
+
+    def visit_ProcedureCall(self, node): #pylint: disable=invalid-name
+        """Propagate Const values into arguments."""
+        args = tuple(self.value(arg) for arg in node['args'])
+        if any(new is not old for new, old in zip(args, node['args'])):
+            return node.replace(args=args)
+        return node
+
+def fold_constants(tree: ast.FrozenDict, constants=None) -> ast.FrozenDict:
+    """Return tree with constant expressions folded."""
+    return ConstantFolder(constants).visit(tree)
@@ -4,6 +4,8 @@
 
 #pylint: disable=invalid-name
 
+import pathlib
+
 from ply import lex
 
 class LexerGlobals:
@@ -85,24 +87,90 @@ def t_error(t):
                                       .format(char=t.value[0], position=position(t)))
     t.lexer.skip(1)
 
+LEXTAB = 'llb3d.lextab'
+
+_master_lexer = None
+
+def fresh_tables(tabmodule: str, *sources) -> bool:
+    """Check that tables module in package directory is newer than sources.
+
+    Tables are generated at build time (see setup.py), stale tables in
+    development tree are ignored.
+    """
+    table = pathlib.Path(__file__).parent / '{name}.py'.format(name=tabmodule.rpartition('.')[2])
+    try:
+        table_mtime = table.stat().st_mtime
+    except FileNotFoundError:
+        return False
+    return all(pathlib.Path(source).stat().st_mtime <= table_mtime for source in sources)
+
+def build_lexer(optimize=None, outputdir=None):
+    """Build master lexer, that is cloned for every compile.
+
+    With optimize lexer tables are saved into lextab module in outputdir
+    (package directory by default) and loaded from it next time.
+    By default tables are loaded, if they are generated for current lexer.
+    """
+    global _master_lexer #pylint: disable=global-statement
+    if optimize is None:
+        optimize = outputdir is None and fresh_tables(LEXTAB, __file__)
+    if optimize:
+        if outputdir is None:
+            outputdir = pathlib.Path(__file__).parent
+        _master_lexer = lex.lex(optimize=True, lextab=LEXTAB, outputdir=str(outputdir))
+    else:
+        _master_lexer = lex.lex()
+    return _master_lexer
+
 def init_lexer(code):
-    """Init lexer."""
-    lexer = lex.lex()
+    """Init lexer.
+
+    Lexer is a cheap clone of master lexer with own globals.
+    """
+    if _master_lexer is None:
+        build_lexer()
+
+    lexer = _master_lexer.clone()
     lexer.lineno = 1
     lexer.globals = LexerGlobals(code)
     lexer.input(code)
 
     return lexer
 
-def get_lexer(code):
-    """Check lex errors and get lexer."""
-    lexer = init_lexer(code)
+class TokenStream:
+    """Single pass token stream.
 
-    for _token in lexer: #pylint: disable=unused-variable
-        pass
+    Tokens are produced on demand, so parser can consume them directly.
+    Lex errors are collected and raised as SyntaxError at the end of input.
 
-    if lexer.globals.error_list != []:
-        raise SyntaxError("\n".join(lexer.globals.error_list))
+    >>> tuple(token.type for token in TokenStream(init_lexer('Print 10')))
+    ('ID', 'INTLIT')
+    """
 
-    lexer = init_lexer(code)
-    return lexer
+    def __init__(self, lexer):
+        """Initialize self.  See help(type(self)) for accurate signature."""
+        self.lexer = lexer
+        # Parser attaches the stream to error tokens without lexer
+        self.globals = lexer.globals
+
+    def token(self):
+        """Return next token or None at the end of input."""
+        token = self.lexer.token()
+        if token is None and self.lexer.globals.error_list != []:
+            raise SyntaxError("\n".join(self.lexer.globals.error_list))
+        return token
+
+    def __iter__(self):
+        """Implement iter(self)."""
+        return self
+
+    def __next__(self):
+        """Implement next(self)."""
+        token = self.token()
+        if token is None:
+            raise StopIteration
+        return token
+
+def get_lexer(code):
+    """Get single pass token stream for the source code."""
+    return TokenStream(init_lexer(code))
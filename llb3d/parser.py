@@ -4,18 +4,32 @@
 
 #pylint: disable=invalid-name
 
+import copy
+import pathlib
+import threading
+
 from ply import yacc
 
-from . import ast, lexer
+from . import ast, lexer, serialize
+from .cache import make_key
+from .report import phase
+from .version import VERSION
 
 from .lexer import tokens #pylint: disable=unused-import
 
 class ParserGlobals:
     """Global variables for parser."""
 
-    def __init__(self):
+    def __init__(self, interner=None):
         """Global variables for parser."""
         self.error_list = []
+        self.interner = interner
+
+    def make(self, cls, *args):
+        """Create node, canonical one if interner is set."""
+        if self.interner is None:
+            return cls(*args)
+        return self.interner(cls, *args)
 
 start = 'program'
 
@@ -32,38 +46,46 @@ def p_statement_descent(p):
     """
     p[0] = p[1]
 
+def p_statement_empty(_p):
+    r"""global_statement : empty
+        local_statement : empty
+    """
+
 def p_statements_start(p):
     r"""global_statements : global_statement
         local_statements : local_statement
     """
-    p[0] = ast.Body((p[1], ))
+    # Statements are accumulated in list and frozen into Body once
+    p[0] = [p[1]] if p[1] is not None else []
 
 def p_statement_rest(p):
     r"""global_statements : global_statements '\n' global_statement
         local_statements : local_statements '\n' local_statement
     """
-    p[0] = ast.Body(p[1]['statements'] + (p[3], ))
+    p[0] = p[1]
+    if p[3] is not None:
+        p[0].append(p[3])
 
 
 # Identifier
 
 def p_id(p):
     r"""id : ID"""
-    p[0] = ast.Identifier(p[1])
+    p[0] = p.parser.globals.make(ast.Identifier, p[1])
 
 # Literals
 
 def p_atom_int(p):
     r"""atom : INTLIT"""
-    p[0] = ast.IntLiteral(int(p[1]))
+    p[0] = p.parser.globals.make(ast.IntLiteral, int(p[1]))
 
 def p_atom_float(p):
     r"""atom : FLOATLIT"""
-    p[0] = ast.FloatLiteral(float(p[1]))
+    p[0] = p.parser.globals.make(ast.FloatLiteral, float(p[1]))
 
 def p_atom_string(p):
     r"""atom : STRLIT"""
-    p[0] = ast.StrLiteral(p[1])
+    p[0] = p.parser.globals.make(ast.StrLiteral, p[1])
 
 def p_atom_id(p):
     r"""atom : id"""
@@ -79,11 +101,12 @@ def p_expression_descent(p):
 
 def p_exprlist_start(p):
     r"""exprlist : expression"""
-    p[0] = (p[1], )
+    p[0] = [p[1]]
 
 def p_exprlist_rest(p):
     r"""exprlist : exprlist ',' expression"""
-    p[0] = p[1] + (p[3], )
+    p[0] = p[1]
+    p[0].append(p[3])
 
 # Procedure call
 
@@ -96,35 +119,143 @@ def p_proccall(p):
                  | id empty
     """
     if p[2] is None:
-        p[0] = ast.ProcedureCall(p[1], tuple())
+        p[0] = p.parser.globals.make(ast.ProcedureCall, p[1], tuple())
     else:
-        p[0] = ast.ProcedureCall(p[1], p[2])
+        p[0] = p.parser.globals.make(ast.ProcedureCall, p[1], tuple(p[2]))
+
+# Include
+
+def p_statement_include(p):
+    r"""statement : INCLUDE STRLIT"""
+    p[0] = p.parser.globals.make(ast.Include, p[2])
 
 # Program
 
 def p_start(p):
     r"""program : global_statements"""
-    p[0] = ast.Program(p[1]['statements'])
+    p[0] = p.parser.globals.make(ast.Program, tuple(p[1]))
+
+def error_message(p) -> str:
+    """Return message for unexpected token p (None at the end of input)."""
+    if not p:
+        return "Unexpected EOF"
+
+    return ("Unexpected {type} '{value}' at {position}"
+            .format(type=p.type, value=p.value, position=lexer.position(p)))
 
 # Error rule for syntax errors
 def p_error(p):
-    """Error handler."""
-    if not p:
-        parser.globals.error_list.append("Unexpected EOF")
-        return
+    """Error handler of master parser, every Parser replaces it with own one."""
+    raise SyntaxError(error_message(p))
+
+PARSETAB = 'llb3d.parsetab'
+
+_master_parser = None
+_master_parser_lock = threading.Lock()
+
+def build_parser(optimize=None, outputdir=None) -> yacc.LRParser:
+    """Build master parser.
 
-    parser.globals.error_list.append("Unexpected {type} '{value}' at {position}"
-                                     .format(type=p.type, value=p.value,
-                                             position=lexer.position(p)))
+    Parse tables are loaded from parsetab module in outputdir (package
+    directory by default), they are generated and saved there, if grammar
+    has changed. With optimize grammar signature isn't checked, by default
+    it's set if tables are generated for current grammar (at build time).
+    """
+    global _master_parser #pylint: disable=global-statement
+    if optimize is None:
+        optimize = outputdir is None and lexer.fresh_tables(PARSETAB, __file__, lexer.__file__)
+    if outputdir is None:
+        outputdir = pathlib.Path(__file__).parent
+    _master_parser = yacc.yacc(debug=False, optimize=optimize, tabmodule=PARSETAB,
+                               outputdir=str(outputdir))
+    return _master_parser
+
+def get_master_parser() -> yacc.LRParser:
+    """Return master parser, that holds parse tables shared by all parsers."""
+    with _master_parser_lock:
+        if _master_parser is None:
+            build_parser()
+    return _master_parser
+
+class Parser:
+
+    """Reentrant parser.
+
+    Every instance has own parser state and error list, parse tables are
+    shared, so parsers are cheap and can be used in different threads.
+
+    >>> Parser().parse('Print 10')
+    Program((ProcedureCall(Identifier('Print'), (IntLiteral(10),)),))
+    """
+
+    def __init__(self, interner=None):
+        """Initialize self.  See help(type(self)) for accurate signature."""
+        self.interner = interner
+        self.lr_parser = copy.copy(get_master_parser())
+        self.lr_parser.errorfunc = self.error
+        self.lr_parser.globals = ParserGlobals(interner)
+
+    def error(self, p):
+        """Collect syntax error."""
+        self.lr_parser.globals.error_list.append(error_message(p))
 
-parser = yacc.yacc()
+    def parse(self, code: str) -> ast.Program:
+        """Return AST of the source code."""
+        parser_globals = self.lr_parser.globals = ParserGlobals(self.interner)
+        syntax_tree = self.lr_parser.parse(lexer=lexer.get_lexer(code))
 
-def get_ast(code):
-    """Get AST from the source code."""
-    parser.globals = ParserGlobals()
-    syntax_tree = parser.parse(lexer=lexer.get_lexer(code))
+        if parser_globals.error_list != []:
+            raise SyntaxError("\n".join(parser_globals.error_list))
 
-    if parser.globals.error_list != []:
-        raise SyntaxError("\n".join(parser.globals.error_list))
+        return syntax_tree
+
+def ast_cache_key(code: str) -> str:
+    """Return cache key of parsed source code."""
+    return make_key(code, str(serialize.FORMAT_VERSION), VERSION)
+
+def get_ast(code, interner=None, cache=None):
+    """Get AST from the source code.
+
+    With interner (ast.Interner) equal nodes are shared.
+    With cache (cache.CompilationCache) parsed tree is stored in binary
+    format and loaded on the next call with the same code.
+    """
+    if cache is not None:
+        key = ast_cache_key(code)
+        path = cache.lookup(key, 'ast')
+        if path is not None:
+            with phase('load_ast'):
+                try:
+                    return serialize.load(path, interner)
+                except (ValueError, FileNotFoundError):
+                    # Corrupted or evicted by other process, parse again
+                    pass
+
+    with phase('parse'):
+        syntax_tree = Parser(interner).parse(code)
+
+    if cache is not None:
+        cache.store(key, 'ast', serialize.dumps(syntax_tree))
 
     return syntax_tree
+
+def parse_many(sources, cache=None, workers=None, processes=False) -> list:
+    """Return ASTs of many source codes, parsed concurrently.
+
+    Sources are parsed in thread pool or, with processes, in process pool
+    of workers size. SyntaxError of the first broken source is raised.
+
+    >>> parse_many(['Print 1', 'Print 2'], workers=2)[1]
+    Program((ProcedureCall(Identifier('Print'), (IntLiteral(2),)),))
+    """
+    import concurrent.futures #pylint: disable=import-outside-toplevel
+
+    sources = list(sources)
+    if processes:
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(workers)
+
+    with executor:
+        return list(executor.map(get_ast, sources, [None] * len(sources),
+                                 [cache] * len(sources)))
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""Optimization pipelines for llb3d compiler.
+
+llvmlite is imported on the first use, so command line can list
+pipelines without loading llvm.
+"""
+
+import time
+
+class Pipeline:
+
+    """Optimization pipeline options.
+
+    Pipeline consists of two stages: function passes, that run on every
+    function separately, and module passes.
+    inlining_threshold, loop_vectorize and slp_vectorize equal to None
+    mean llvm default for opt_level.
+
+    >>> PIPELINES['min-size'].size_level
+    2
+    >>> PIPELINES['balanced'].replace(opt_level=0).opt_level
+    0
+    """
+
+    # Pipeline is an options object, attributes are the options
+    #pylint: disable=too-many-instance-attributes
+
+    def __init__(self, opt_level=2, size_level=0, inlining_threshold=None,
+                 loop_vectorize=None, slp_vectorize=None, unroll_loops=True,
+                 function_passes=True, module_passes=True):
+        """See help(type(obj))."""
+        # Pipeline is an options object, every option has default
+        #pylint: disable=too-many-arguments
+        self.opt_level = opt_level
+        self.size_level = size_level
+        self.inlining_threshold = inlining_threshold
+        self.loop_vectorize = loop_vectorize
+        self.slp_vectorize = slp_vectorize
+        self.unroll_loops = unroll_loops
+        self.function_passes = function_passes
+        self.module_passes = module_passes
+
+    def key(self) -> tuple:
+        """Return hashable options."""
+        return (self.opt_level, self.size_level, self.inlining_threshold,
+                self.loop_vectorize, self.slp_vectorize, self.unroll_loops,
+                self.function_passes, self.module_passes)
+
+    def replace(self, **kwargs):
+        """Return copy of pipeline with changed options."""
+        options = dict(vars(self))
+        options.update(kwargs)
+        return type(self)(**options)
+
+    def create_builder(self) -> 'binding.PassManagerBuilder':
+        """Create pass manager builder for options."""
+        from llvmlite import binding #pylint: disable=import-outside-toplevel
+
+        builder = binding.create_pass_manager_builder()
+        builder.opt_level = self.opt_level
+        builder.size_level = self.size_level
+        builder.disable_unroll_loops = not self.unroll_loops
+        if self.inlining_threshold is not None:
+            builder.inlining_threshold = self.inlining_threshold
+        if self.loop_vectorize is not None:
+            builder.loop_vectorize = self.loop_vectorize
+        if self.slp_vectorize is not None:
+            builder.slp_vectorize = self.slp_vectorize
+        return builder
+
+    def run(self, llvm_module: 'binding.ModuleRef', target_machine: 'binding.TargetMachine',
+            time_passes=False) -> dict:
+        """Optimize module inplace.
+
+        Return timings: seconds for every stage and, if time_passes
+        is set, llvm report with time of every pass.
+        Pass report is empty, if llvmlite is older than 0.37.
+        """
+        from llvmlite import binding #pylint: disable=import-outside-toplevel
+
+        timings = {'function': 0.0, 'module': 0.0, 'passes': ''}
+        builder = self.create_builder()
+        time_passes = time_passes and hasattr(binding, 'set_time_passes')
+
+        if time_passes:
+            binding.set_time_passes(True)
+
+        try:
+            if self.function_passes:
+                start = time.perf_counter()
+                function_pass_manager = binding.create_function_pass_manager(llvm_module)
+                target_machine.add_analysis_passes(function_pass_manager)
+                builder.populate(function_pass_manager)
+                function_pass_manager.initialize()
+                for function in llvm_module.functions:
+                    if not function.is_declaration:
+                        function_pass_manager.run(function)
+                function_pass_manager.finalize()
+                timings['function'] = time.perf_counter() - start
+
+            if self.module_passes:
+                start = time.perf_counter()
+                module_pass_manager = binding.create_module_pass_manager()
+                target_machine.add_analysis_passes(module_pass_manager)
+                builder.populate(module_pass_manager)
+                module_pass_manager.run(llvm_module)
+                timings['module'] = time.perf_counter() - start
+        finally:
+            if time_passes:
+                timings['passes'] = binding.report_and_reset_timings()
+                binding.set_time_passes(False)
+
+        return timings
+
+PIPELINES = {
+    'fast-compile': Pipeline(opt_level=0, loop_vectorize=False, slp_vectorize=False,
+                             unroll_loops=False, function_passes=False),
+    'balanced': Pipeline(opt_level=2),
+    'max-speed': Pipeline(opt_level=3, inlining_threshold=275,
+                          loop_vectorize=True, slp_vectorize=True),
+    'min-size': Pipeline(opt_level=2, size_level=2, inlining_threshold=25,
+                         loop_vectorize=False, slp_vectorize=False, unroll_loops=False),
+}
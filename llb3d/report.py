@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+"""Compile-phase timing and memory report for llb3d compiler.
+
+Compiler phases are wrapped with phase context manager, that records
+into current report, if any.
+
+>>> report = Report()
+>>> with ReportProvider(report):
+...     with phase('parse'):
+...         with phase('lex'):
+...             pass
+>>> [(record['name'], record['depth']) for record in report.records]
+[('parse', 0), ('lex', 1)]
+"""
+
+import json
+import time
+import threading
+import tracemalloc
+
+def _reset_peak():
+    """Reset traced memory peak, if python supports it (3.9+).
+
+    On older python peak of phase may include peaks of preceding phases.
+    """
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+
+class Report:
+
+    """Timing and memory report.
+
+    Every record is a dict with phase name, nesting depth, wall and cpu time
+    in seconds and peak memory in bytes, allocated by python during phase
+    (if memory is traced). Compilation cache statistics (see
+    CompilationCache.stats) are reported, if cache is set.
+    """
+
+    def __init__(self, trace_memory=False):
+        """See help(type(obj))."""
+        self.trace_memory = trace_memory
+        self.records = []
+        self._stack = []
+        self._started_tracing = False
+        self.cache = None
+
+    def enter(self, name: str):
+        """Start phase."""
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            _reset_peak()
+        else:
+            current = 0
+
+        record = {'name': name, 'depth': len(self._stack),
+                  'wall': 0.0, 'cpu': 0.0, 'peak_memory': 0}
+        self.records.append(record)
+        self._stack.append({'record': record, 'memory': current, 'peak': current,
+                            'wall': time.perf_counter(), 'cpu': time.process_time()})
+
+    def exit(self):
+        """Finish current phase."""
+        frame = self._stack.pop()
+        record = frame['record']
+        record['wall'] = time.perf_counter() - frame['wall']
+        record['cpu'] = time.process_time() - frame['cpu']
+
+        if self.trace_memory:
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            record['peak_memory'] = peak - frame['memory']
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            _reset_peak()
+
+            if not self._stack and self._started_tracing:
+                # Tracing slows down everything, so it's stopped between phases
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    def as_dict(self) -> dict:
+        """Return report for machine ingestion."""
+        top_level = [record for record in self.records if record['depth'] == 0]
+        return {
+            'phases': self.records,
+            'total': {
+                'wall': sum(record['wall'] for record in top_level),
+                'cpu': sum(record['cpu'] for record in top_level),
+                'peak_memory': max((record['peak_memory'] for record in top_level), default=0),
+            },
+            'cache': self.cache,
+        }
+
+    def to_json(self) -> str:
+        """Return report as json."""
+        return json.dumps(self.as_dict(), indent=2)
+
+    def __str__(self) -> str:
+        """Implement str(self)."""
+        lines = ['{name:<32} {wall:>10} {cpu:>10} {memory:>12}'
+                 .format(name='phase', wall='wall, s', cpu='cpu, s', memory='peak, KiB')]
+        total = self.as_dict()['total']
+        for record in self.records + [dict(total, name='total', depth=0)]:
+            lines.append('{name:<32} {wall:>10.4f} {cpu:>10.4f} {memory:>12.1f}'
+                         .format(name='  ' * record['depth'] + record['name'],
+                                 wall=record['wall'], cpu=record['cpu'],
+                                 memory=record['peak_memory'] / 1024))
+        if self.cache is not None:
+            lines.append('cache: {hits} hits, {misses} misses, {entries} entries, '
+                         '{size:.1f} KiB'.format(hits=self.cache['hits'],
+                                                 misses=self.cache['misses'],
+                                                 entries=self.cache['entries'],
+                                                 size=self.cache['size'] / 1024))
+        return '\n'.join(lines)
+
+_CURRENT_REPORT = threading.local()
+
+class ReportProvider:
+
+    """Make report current for phases in this thread."""
+
+    def __init__(self, report: Report):
+        """See help(type(obj))."""
+        self.report = report
+        self.prev_report = None
+
+    def __enter__(self):
+        """See help(type(obj))."""
+        self.prev_report = getattr(_CURRENT_REPORT, 'report', None)
+        _CURRENT_REPORT.report = self.report
+        return self.report
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        """See help(type(obj))."""
+        _CURRENT_REPORT.report = self.prev_report
+
+class phase: #pylint: disable=invalid-name
+
+    """Record compiler phase into current report.
+
+    Without current report it does nothing.
+    """
+
+    def __init__(self, name: str):
+        """See help(type(obj))."""
+        self.name = name
+        self.report = None
+
+    def __enter__(self):
+        """See help(type(obj))."""
+        self.report = getattr(_CURRENT_REPORT, 'report', None)
+        if self.report is not None:
+            self.report.enter(self.name)
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        """See help(type(obj))."""
+        if self.report is not None:
+            self.report.exit()
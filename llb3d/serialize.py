@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+
+"""Compact binary format for llb3d AST.
+
+File consists of magic, format version, crc32 checksum of the rest,
+node type table (class names), string pool and node records in post-order.
+Every record is a type index and fields in constructor order; a field is
+a tag and a value: reference to earlier record, zigzag varint, float64,
+string pool index or tuple.
+Shared subtrees are written once, so interned trees stay shared on load.
+
+>>> from .ast import BinaryOp, Identifier, IntLiteral
+>>> tree = BinaryOp('+', Identifier('x'), IntLiteral(-1))
+>>> loads(dumps(tree)) == tree
+True
+"""
+
+import mmap
+import struct
+import zlib
+
+from . import ast
+
+MAGIC = b'LLB3DAST'
+FORMAT_VERSION = 2
+
+TAG_NODE = 0
+TAG_INT = 1
+TAG_FLOAT = 2
+TAG_STR = 3
+TAG_TUPLE = 4
+
+_DOUBLE = struct.Struct('<d')
+_CHECKSUM = struct.Struct('<I')
+
+def _write_varint(output: bytearray, value: int):
+    """Write unsigned LEB128 number."""
+    while value >= 0x80:
+        output.append(value & 0x7f | 0x80)
+        value >>= 7
+    output.append(value)
+
+def _zigzag(value: int) -> int:
+    """Map signed number to unsigned."""
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+def _unzigzag(value: int) -> int:
+    """Map unsigned number to signed."""
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+class _Writer:
+    """Serialization state."""
+
+    def __init__(self):
+        """Initialize self.  See help(type(self)) for accurate signature."""
+        self.types = {}
+        self.strings = {}
+        self.nodes = {}
+        self.records = bytearray()
+
+    def index(self, table: dict, value) -> int:
+        """Return index of value in table, adding it if needed."""
+        return table.setdefault(value, len(table))
+
+    def write_field(self, value):
+        """Write field value."""
+        records = self.records
+        if isinstance(value, ast.FrozenDict):
+            records.append(TAG_NODE)
+            _write_varint(records, self.nodes[id(value)])
+        elif isinstance(value, bool):
+            raise TypeError('Unsupported field value: {value!r}'.format(value=value))
+        elif isinstance(value, int):
+            records.append(TAG_INT)
+            _write_varint(records, _zigzag(value))
+        elif isinstance(value, float):
+            records.append(TAG_FLOAT)
+            records += _DOUBLE.pack(value)
+        elif isinstance(value, str):
+            records.append(TAG_STR)
+            _write_varint(records, self.index(self.strings, value))
+        elif isinstance(value, tuple):
+            records.append(TAG_TUPLE)
+            _write_varint(records, len(value))
+            for item in value:
+                self.write_field(item)
+        else:
+            raise TypeError('Unsupported field value: {value!r}'.format(value=value))
+
+    def write_node(self, node: ast.FrozenDict):
+        """Write node record, children should be written before."""
+        cls = type(node)
+        _write_varint(self.records, self.index(self.types, cls.__name__))
+        for name in ast._init_params(cls): #pylint: disable=protected-access
+            self.write_field(node[name])
+        self.nodes[id(node)] = len(self.nodes)
+
+    def write_tree(self, tree: ast.FrozenDict):
+        """Write all nodes of tree in post-order."""
+        stack = [(tree, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in self.nodes:
+                continue
+            if expanded:
+                self.write_node(node)
+                continue
+            stack.append((node, True))
+            for value in reversed(tuple(node.values())):
+                if isinstance(value, ast.FrozenDict):
+                    stack.append((value, False))
+                elif isinstance(value, tuple):
+                    stack.extend((item, False) for item in reversed(value)
+                                 if isinstance(item, ast.FrozenDict))
+
+    def getvalue(self) -> bytes:
+        """Return serialized data."""
+        payload = bytearray()
+        for table in (self.types, self.strings):
+            _write_varint(payload, len(table))
+            for value in table:
+                data = value.encode('utf-8')
+                _write_varint(payload, len(data))
+                payload += data
+        _write_varint(payload, len(self.nodes))
+        payload += self.records
+
+        output = bytearray(MAGIC)
+        _write_varint(output, FORMAT_VERSION)
+        output += _CHECKSUM.pack(zlib.crc32(payload))
+        output += payload
+        return bytes(output)
+
+def dumps(tree: ast.FrozenDict) -> bytes:
+    """Return serialized tree."""
+    writer = _Writer()
+    writer.write_tree(tree)
+    return writer.getvalue()
+
+def _template(node: ast.Statement) -> tuple:
+    """Return pickle constructor and layout for nodes of the same type."""
+    restore, (_, keys, _, format_str) = node.__reduce__()
+    params = ast._init_params(type(node)) #pylint: disable=protected-access
+    return restore, keys, tuple(params.index(key) for key in keys), format_str
+
+class _Reader:
+    """Deserialization state."""
+
+    def __init__(self, data, interner=None):
+        """Initialize self.  See help(type(self)) for accurate signature."""
+        self.data = data
+        self.interner = interner
+        self.position = 0
+        self.nodes = []
+        self.strings = []
+
+    def read_varint(self) -> int:
+        """Read unsigned LEB128 number."""
+        data = self.data
+        result = 0
+        shift = 0
+        while True:
+            byte = data[self.position]
+            self.position += 1
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def read_str(self) -> str:
+        """Read length-prefixed utf-8 string."""
+        length = self.read_varint()
+        start = self.position
+        self.position += length
+        if self.position > len(self.data):
+            raise IndexError('String is out of data')
+        return str(self.data[start:self.position], 'utf-8')
+
+    def read_field(self):
+        """Read field value."""
+        tag = self.data[self.position]
+        self.position += 1
+        if tag == TAG_NODE:
+            return self.nodes[self.read_varint()]
+        if tag == TAG_INT:
+            return _unzigzag(self.read_varint())
+        if tag == TAG_FLOAT:
+            value, = _DOUBLE.unpack_from(self.data, self.position)
+            self.position += _DOUBLE.size
+            return value
+        if tag == TAG_STR:
+            return self.strings[self.read_varint()]
+        if tag == TAG_TUPLE:
+            return tuple(self.read_field() for _ in range(self.read_varint()))
+        raise ValueError('Unknown field tag {tag}'.format(tag=tag))
+
+    def read_header(self):
+        """Check magic, format version and checksum."""
+        if bytes(self.data[:len(MAGIC)]) != MAGIC:
+            raise ValueError('Not an llb3d AST')
+        self.position = len(MAGIC)
+        if self.read_varint() != FORMAT_VERSION:
+            raise ValueError('Unsupported AST format version')
+        # Nodes are restored without validation, so data is checked first
+        checksum, = _CHECKSUM.unpack_from(self.data, self.position)
+        self.position += _CHECKSUM.size
+        if zlib.crc32(self.data[self.position:]) != checksum:
+            raise ValueError('Corrupted AST')
+
+    def read_types(self) -> list:
+        """Read node type table.
+
+        Every type is a list of class, field count and pickle template.
+        """
+        types = []
+        for _ in range(self.read_varint()):
+            cls = getattr(ast, self.read_str(), None)
+            if not isinstance(cls, type) or not issubclass(cls, ast.Statement):
+                raise ValueError('Unknown node type')
+            types.append([cls, len(ast._init_params(cls)), None]) #pylint: disable=protected-access
+        return types
+
+    def read_nodes(self, types: list):
+        """Read node records into self.nodes."""
+        # Without validation only the first node of every type is created
+        # by constructor, others are restored like in pickle
+        validation = ast.get_validation()
+        interner = self.interner
+        read_field = self.read_field
+        for _ in range(self.read_varint()):
+            node_type = types[self.read_varint()]
+            cls, field_count, template = node_type
+            fields = [read_field() for _ in range(field_count)]
+            if validation or template is None:
+                node = cls(*fields)
+                if not validation:
+                    node_type[2] = _template(node)
+            else:
+                restore, keys, order, format_str = template
+                node = restore(cls, keys, tuple(fields[index] for index in order), format_str)
+            if interner is not None:
+                node = interner.intern(node)
+            self.nodes.append(node)
+
+    def read_tree(self) -> ast.FrozenDict:
+        """Read whole data and return root node."""
+        self.read_header()
+        types = self.read_types()
+        self.strings = [self.read_str() for _ in range(self.read_varint())]
+        self.read_nodes(types)
+
+        if not self.nodes or self.position != len(self.data):
+            raise ValueError('Corrupted AST')
+        return self.nodes[-1]
+
+def loads(data, interner=None) -> ast.FrozenDict:
+    """Return tree from bytes-like object.
+
+    With interner (ast.Interner) equal nodes are shared.
+    Raise ValueError if data is not a valid AST.
+    """
+    with memoryview(data) as view:
+        try:
+            return _Reader(view, interner).read_tree()
+        except (IndexError, UnicodeDecodeError, struct.error, TypeError):
+            # TypeError is raised by node constructors with validation
+            raise ValueError('Corrupted AST') from None
+
+def load(filename, interner=None) -> ast.FrozenDict:
+    """Return tree from file, the file is mapped into memory."""
+    with open(filename, 'rb') as input_file:
+        try:
+            mapped = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as error:
+            raise ValueError('Corrupted AST') from error
+    with mapped:
+        return loads(mapped, interner)
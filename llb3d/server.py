@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+"""Compiler daemon for llb3d.
+
+Daemon keeps parse tables, llvm and target machine warm and serves
+requests over Unix socket, see client module for protocol.
+"""
+
+import os
+import json
+import socket
+import pathlib
+import contextlib
+import threading
+import socketserver
+
+from . import ast, driver, lexer, parser
+from .backend import TargetOptions, initialize_llvm, get_target_machine
+from .client import default_socket_path
+from .version import VERSION
+
+EXECUTABLE_NAME = 'program'
+BITCODE_NAME = 'program.bc'
+
+@contextlib.contextmanager
+def validation(enabled: bool):
+    """Switch validation mode inside context."""
+    previous = ast.get_validation()
+    ast.set_validation(enabled)
+    try:
+        yield
+    finally:
+        ast.set_validation(previous)
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    """Serve requests of one connection."""
+
+    def handle(self):
+        """Answer every request line."""
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError as error:
+                response = {'status': 'error', 'type': 'ValueError',
+                            'message': 'Malformed request: {error}'.format(error=error)}
+            else:
+                response = self.server.dispatch(request)
+
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            if self.server.stopped:
+                break
+
+class CompilerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    """Compiler daemon.
+
+    Every connection is served in own thread, but requests are executed
+    one by one.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path=None):
+        """See help(type(obj))."""
+        self.path = pathlib.Path(path) if path is not None else default_socket_path()
+        self.stopped = False
+        self.request_count = 0
+        self.lock = threading.Lock()
+        remove_stale_socket(self.path)
+        super().__init__(str(self.path), RequestHandler)
+        os.chmod(str(self.path), 0o600)
+
+    def warm_up(self):
+        """Build lexer and parser tables, initialize llvm and target machine."""
+        lexer.build_lexer()
+        parser.get_master_parser()
+        initialize_llvm()
+        get_target_machine(TargetOptions())
+
+    def serve(self):
+        """Serve requests until shutdown request."""
+        self.warm_up()
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+
+    def server_close(self):
+        """Close and remove socket."""
+        super().server_close()
+        with contextlib.suppress(FileNotFoundError):
+            self.path.unlink()
+
+    def dispatch(self, request: dict) -> dict:
+        """Execute request and return response."""
+        with self.lock:
+            return self.execute(request)
+
+    def execute(self, request: dict) -> dict:
+        """Execute request and return response, without lock."""
+        self.request_count += 1
+        command = getattr(self, 'command_{name}'.format(name=request.get('command')), None)
+        if command is None:
+            return {'status': 'error', 'type': 'ValueError',
+                    'message': 'Unknown command {name!r}'.format(name=request.get('command'))}
+
+        try:
+            response = command(request)
+        except Exception as error: #pylint: disable=broad-except
+            message = error.msg if isinstance(error, SyntaxError) else str(error)
+            return {'status': 'error', 'type': type(error).__name__, 'message': message}
+
+        response['status'] = 'ok'
+        return response
+
+    def command_ping(self, _request):
+        """Return daemon version."""
+        return {'version': VERSION, 'pid': os.getpid()}
+
+    def command_shutdown(self, _request):
+        """Stop daemon after response."""
+        self.stopped = True
+        # shutdown waits for serve_forever, that runs in other thread
+        threading.Thread(target=self.shutdown).start()
+        return {}
+
+    def command_build(self, request):
+        """Build source file."""
+        options = dict(request.get('options', {}))
+        with validation(options.pop('validate', False)):
+            backend = driver.create_backend(**options)
+            output = driver.build(request['source'], request.get('output'),
+                                  request.get('emit', 'exe'), backend)
+        return {'output': str(output)}
+
+    def command_compile(self, request):
+        """Compile source file for running by client.
+
+        Executable (optimized bitcode and unit objects with jit) is written
+        into client directory, client runs program with its own environment.
+        """
+        options = dict(request.get('options', {}))
+        directory = pathlib.Path(request['directory'])
+        with validation(options.pop('validate', False)):
+            backend = driver.create_backend(**options)
+            with open(request['source'], encoding='utf-8') as source:
+                driver.compile_source(source.read(), backend,
+                                      os.path.dirname(request['source']))
+
+        if not request.get('jit', False):
+            executable = directory / EXECUTABLE_NAME
+            backend.emit_executable(str(executable))
+            return {'executable': str(executable)}
+
+        bitcode = directory / BITCODE_NAME
+        bitcode.write_bytes(backend.optimize().as_bitcode())
+        unit_objects = []
+        for index, obj in enumerate(backend.unit_objects):
+            unit_object = directory / 'unit{index}.o'.format(index=index)
+            unit_object.write_bytes(obj)
+            unit_objects.append(str(unit_object))
+        return {'bitcode': str(bitcode), 'unit_objects': unit_objects}
+
+def remove_stale_socket(path: pathlib.Path):
+    """Remove socket of dead daemon.
+
+    Raise RuntimeError if daemon is running.
+    """
+    if not path.exists():
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(str(path))
+        except (ConnectionRefusedError, FileNotFoundError):
+            pass
+        else:
+            raise RuntimeError('Daemon is already running at {path}'.format(path=path))
+
+    with contextlib.suppress(FileNotFoundError):
+        path.unlink()
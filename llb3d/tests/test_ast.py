@@ -2,6 +2,10 @@
 
 """Test case for ast."""
 
+import io
+import copy
+import pickle
+
 from pytest import raises
 
 from .. import ast
@@ -134,6 +138,14 @@ def test_recursive_body():
     assert body['statements'] is body_tuple
     assert str(body) == '  10\n    20\n    30\n  40'
 
+def test_nested_body():
+    """Check code blocks nested in statements."""
+    loop = ast.Statement('While 1\n{body}', body=ast.Body((ast.IntLiteral(20),
+                                                            ast.IntLiteral(30))))
+    assert str(loop) == 'While 1\n  20\n  30'
+    body = ast.Body((ast.IntLiteral(10), loop))
+    assert str(body) == '  10\n  While 1\n    20\n    30'
+
 def test_program():
     """Check program block."""
     program_tuple = (ast.IntLiteral(10), ast.IntLiteral(20))
@@ -152,3 +164,108 @@ def test_program_block():
     program = ast.Program(program_tuple)
     assert program['statements'] is program_tuple
     assert str(program) == '10\n  20\n  30\n40'
+
+def test_compact_nodes():
+    """Check that nodes have no per-instance dict and share key layout."""
+    first = ast.BinaryOp('+', ast.Identifier('a'), ast.IntLiteral(1))
+    second = ast.BinaryOp('-', ast.Identifier('b'), ast.IntLiteral(2))
+    assert not hasattr(first, '__dict__')
+    assert first._layout is second._layout #pylint: disable=protected-access
+    assert first.op == '+'
+
+    with raises(AttributeError):
+        print(first._unknown) #pylint: disable=protected-access
+
+def test_frozen_dict_order():
+    """Check that key order doesn't matter for equality."""
+    assert ast.FrozenDict(a=10, b=20) == ast.FrozenDict(b=20, a=10)
+    assert hash(ast.FrozenDict(a=10, b=20)) == hash(ast.FrozenDict(b=20, a=10))
+
+def test_pickle():
+    """Check that nodes can be pickled and copied."""
+    program = ast.Program((ast.ProcedureCall(ast.Identifier('Print'),
+                                             (ast.StrLiteral('Hello'), )), ))
+    restored = pickle.loads(pickle.dumps(program))
+    assert restored == program
+    assert str(restored) == str(program)
+    assert restored['statements'][0]._layout is program['statements'][0]._layout #pylint: disable=protected-access
+    assert copy.deepcopy(program) == program
+
+def test_validation_mode():
+    """Check that type checks can be switched off."""
+    validation = ast.get_validation()
+    try:
+        ast.set_validation(False)
+        assert not ast.get_validation()
+        literal = ast.IntLiteral('string')
+        assert literal['value'] == 'string'
+        assert repr(literal) == "IntLiteral('string')"
+
+        ast.set_validation(True)
+        assert ast.get_validation()
+        with raises(TypeError):
+            ast.IntLiteral('string')
+    finally:
+        ast.set_validation(validation)
+
+    with raises(TypeError):
+        ast.validate(ast.Program((ast.ProcedureCall(ast.Identifier('Print'), (literal, )), )))
+
+def test_validate():
+    """Check that valid tree passes validation."""
+    program = ast.Program((ast.ProcedureCall(ast.Identifier('Print'),
+                                             (ast.StrLiteral('Hello'),
+                                              ast.BinaryOp('+', ast.IntLiteral(1),
+                                                           ast.FloatLiteral(2.0)))),
+                           ast.Body((ast.UnaryOp('-', ast.Identifier('x')), ))))
+    ast.validate(program)
+
+def test_float_literal_equality():
+    """Check that float literals compare values exactly."""
+    assert ast.FloatLiteral(0.5) == ast.FloatLiteral(0.5)
+    assert hash(ast.FloatLiteral(0.5)) == hash(ast.FloatLiteral(0.5))
+    assert ast.FloatLiteral(0.0) != ast.FloatLiteral(-0.0)
+    assert ast.FloatLiteral(float('nan')) == ast.FloatLiteral(float('nan'))
+
+def test_deep_tree_hash():
+    """Check that deep trees are hashed and compared without recursion."""
+    def chain(value):
+        """Create deep chain of unary operators."""
+        expression = ast.IntLiteral(value)
+        for _ in range(5000):
+            expression = ast.UnaryOp('-', expression)
+        return expression
+
+    assert hash(chain(1)) == hash(chain(1))
+    assert chain(1) == chain(1)
+    assert chain(1) != chain(2)
+
+def test_interner():
+    """Check that interned nodes are shared."""
+    interner = ast.Interner()
+    first = interner(ast.BinaryOp, '+', interner(ast.Identifier, 'x'),
+                     interner(ast.IntLiteral, 1))
+    second = interner(ast.BinaryOp, '+', interner(ast.Identifier, 'x'),
+                      interner(ast.IntLiteral, 1))
+    assert first is second
+    assert first['left'] is second['left']
+    assert len(interner) == 3
+
+    assert interner(ast.FloatLiteral, 0.0) is not interner(ast.FloatLiteral, -0.0)
+    assert interner(ast.IntLiteral, 1) is not interner(ast.FloatLiteral, 1.0)
+    assert interner.intern(ast.Identifier('x')) is first['left']
+
+def test_write_to():
+    """Check that tree is written to stream."""
+    program = ast.Program((ast.ProcedureCall(ast.Identifier('Print'),
+                                             (ast.BinaryOp('+', ast.StrLiteral('a'),
+                                                           ast.UnaryOp('-', ast.IntLiteral(1))),
+                                              ast.FloatLiteral(0.5))),
+                           ast.Body((ast.IntLiteral(20),
+                                     ast.Body((ast.IntLiteral(30), )))),
+                           ast.ProcedureCall(ast.Identifier('End'), tuple())))
+    stream = io.StringIO()
+    program.write_to(stream)
+    assert stream.getvalue() == 'Print (a + -1), 0.5\n  20\n    30\nEnd '
+    assert str(program) == stream.getvalue()
+    assert 'args_str' not in program['statements'][0]
@@ -2,11 +2,15 @@
 
 """Test case for backend."""
 
+import os
+import time
 import subprocess
 
 from llvmlite import ir, binding
+from pytest import raises, skip
 
-from ..backend import Backend
+from ..backend import Backend, TargetOptions, runtime_bitcode, wait_child
+from ..cache import CompilationCache
 from .. import backend as backend_module
 
 def test_types():
@@ -31,17 +35,50 @@ def test_optimize():
     backend = Backend()
     assert isinstance(backend.optimize(), binding.ModuleRef)
 
+def test_optimize_memoize():
+    """Check that optimized module is reused until source is changed."""
+    backend = Backend()
+    llvm_module = backend.optimize()
+    assert backend.optimize() is llvm_module
+    assert backend.optimize(opt_level=0) is not llvm_module
+
+    ir.Function(backend.source_module, backend_module.BBMAIN_SIGNATURE, name='bbother')
+    assert backend.optimize() is not llvm_module
+
 def test_emit_llvm():
     """Check that emit_llvm return valid llvm."""
     backend = Backend()
     assert 'bbmain' in backend.emit_llvm()
 
+def test_target_machine():
+    """Check that target machine is configurable and reused."""
+    backend = Backend()
+    target_machine = backend.get_target_machine()
+    assert isinstance(target_machine, binding.TargetMachine)
+    assert backend.get_target_machine() is target_machine
+    assert Backend().get_target_machine() is target_machine
+
+    backend.target = TargetOptions.host(codemodel='small')
+    assert backend.target.cpu == binding.get_host_cpu_name()
+    assert backend.get_target_machine() is not target_machine
+    assert 'bbmain' in backend.emit_assembly()
+
 def test_emit_assembly():
     """Check that in assembler remains bbmain."""
     backend = Backend()
     asm = backend.emit_assembly()
     assert 'bbmain' in asm
 
+def test_emit_keeps_memoized():
+    """Check that code generation doesn't modify memoized module."""
+    backend = Backend()
+    backend.string_constant('Hello')
+    llvm = backend.emit_llvm()
+    backend.emit_assembly()
+    assert backend.emit_llvm() == llvm
+    backend.emit_object()
+    assert backend.emit_llvm() == llvm
+
 def test_run():
     """Check that we can run llvm program."""
     backend = Backend()
@@ -61,3 +98,125 @@ def test_emit_executable(tmpdir):
     backend.emit_executable(output)
     output.check(file=1, exists=1)
     assert output.sysexec() == ''
+
+def test_run_jit():
+    """Check that we can run llvm program in-process."""
+    backend = Backend()
+
+    run = backend.run(jit=True)
+    assert isinstance(run, subprocess.CompletedProcess)
+    assert run.returncode == 0
+    assert run.stdout is None
+
+    run = backend.run(jit=True, stdout=subprocess.PIPE, encoding='utf-8')
+    assert run.stdout == ''
+
+    run = backend.run_jit(isolate=False, stdout=subprocess.PIPE)
+    assert run.stdout == b''
+
+    run = backend.run(jit=True, input='', stdin=None, timeout=10, cwd='/', env={},
+                      stdout=subprocess.PIPE, encoding='utf-8')
+    assert run.stdout == ''
+    with raises(TypeError):
+        backend.run(jit=True, shell=True)
+    with raises(ValueError):
+        backend.run_jit(isolate=False, cwd='/')
+
+def test_wait_child():
+    """Check that forked child is killed after timeout."""
+    pid = os.fork()
+    if pid == 0:
+        time.sleep(10)
+        os._exit(0) #pylint: disable=protected-access
+    with raises(subprocess.TimeoutExpired):
+        wait_child(pid, timeout=0.1)
+
+def test_emit_object():
+    """Check that object file is elf with bbmain."""
+    backend = Backend()
+    obj = backend.emit_object()
+    assert isinstance(obj, bytes)
+    assert b'bbmain' in obj
+
+def test_emit_executable_cmake(tmpdir):
+    """Check that cmake fallback creates empty executable."""
+    backend = Backend()
+
+    output = tmpdir.join('output')
+    backend.emit_executable_cmake(output)
+    output.check(file=1, exists=1)
+    assert output.sysexec() == ''
+
+def test_cache(tmpdir):
+    """Check that artifacts are reused from cache."""
+    backend = Backend()
+    backend.cache = CompilationCache(tmpdir.join('cache'))
+
+    assert isinstance(backend.optimize(), binding.ModuleRef)
+    assert isinstance(backend.optimize(), binding.ModuleRef)
+    assert backend.cache.hits == 0
+
+    other_backend = Backend()
+    other_backend.cache = backend.cache
+    assert isinstance(other_backend.optimize(), binding.ModuleRef)
+    assert backend.cache.hits == 1
+
+    output = tmpdir.join('output')
+    backend.emit_executable(output)
+    hits = backend.cache.hits
+    backend.emit_executable(output)
+    assert backend.cache.hits == hits + 1
+    assert output.sysexec() == ''
+
+def test_lto():
+    """Check that runtime is linked into module."""
+    if not runtime_bitcode():
+        skip('Runtime bitcode is not built (clang is not found)')
+    backend = Backend()
+    backend.lto = True
+
+    llvm_module = backend.optimize()
+    assert llvm_module.get_function('main').linkage == binding.Linkage.external
+
+    run = backend.run(stdout=subprocess.PIPE, encoding='utf-8')
+    assert run.stdout == ''
+
+def add_helpers(backend, count):
+    """Add internal functions, called from bbmain, that print their numbers."""
+    for index in range(count):
+        helper = ir.Function(backend.source_module, ir.FunctionType(ir.VoidType(), ()),
+                             'helper{index}'.format(index=index))
+        helper.linkage = 'internal'
+        builder = ir.IRBuilder(helper.append_basic_block('entry'))
+        builder.call(backend.runtime['Print'],
+                     (backend.string_constant('helper {index}'.format(index=index)), ))
+        builder.ret_void()
+        backend.builder.call(helper, ())
+
+def test_partition_module():
+    """Check that every function is emitted in one partition."""
+    backend = Backend()
+    add_helpers(backend, 3)
+
+    source = str(backend.source_module)
+    assert backend_module.partition_module(source, 1) == [source]
+    partitions = [binding.parse_assembly(partition)
+                  for partition in backend_module.partition_module(source, 8)]
+    assert len(partitions) == 4
+    for name in ('bbmain', 'helper0', 'helper1', 'helper2'):
+        linkages = sorted(partition.get_function(name).linkage for partition in partitions)
+        assert linkages.count(binding.Linkage.available_externally) == 3
+
+def test_emit_objects(tmpdir):
+    """Check parallel code generation of partitions."""
+    backend = Backend()
+    add_helpers(backend, 3)
+    backend.cache = CompilationCache(tmpdir.join('cache'))
+    backend.codegen_jobs = 2
+    assert len(backend.emit_objects()) == 2
+    assert backend.cache.stats()['entries'] == 2
+    assert len(backend.emit_objects()) == 2
+    assert backend.cache.hits == 2
+
+    run = backend.run(stdout=subprocess.PIPE, encoding='utf-8')
+    assert run.stdout == 'helper 0\nhelper 1\nhelper 2\n'
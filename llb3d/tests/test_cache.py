@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for compilation cache."""
+
+import os
+
+from ..cache import CompilationCache, make_key, default_cache_directory
+
+def test_default_directory(monkeypatch, tmpdir):
+    """Check that cache lives in XDG cache directory."""
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    assert default_cache_directory() == tmpdir.join('llb3d')
+    assert CompilationCache().directory == tmpdir.join('llb3d')
+
+def test_key():
+    """Check that key depends on every part."""
+    assert make_key('ir', '2') == make_key('ir', '2')
+    assert make_key('ir', '2') != make_key('ir', '3')
+    assert make_key(b'ir') == make_key('ir')
+
+def test_store_load(tmpdir):
+    """Check cache hits and misses."""
+    cache = CompilationCache(tmpdir)
+    key = make_key('source')
+
+    assert cache.load(key, 'bc') is None
+    assert cache.lookup(key, 'o') is None
+    cache.store(key, 'bc', b'bitcode')
+    assert cache.load(key, 'bc') == b'bitcode'
+    assert cache.lookup(key, 'o') is None
+
+    assert cache.stats() == {'hits': 1, 'misses': 3, 'entries': 1, 'size': 7}
+
+def test_store_file(tmpdir):
+    """Check that files are stored with permissions."""
+    cache = CompilationCache(tmpdir.join('cache'))
+    executable = tmpdir.join('executable')
+    executable.write('#!/bin/sh\n')
+    executable.chmod(0o755)
+
+    path = cache.store_file(make_key('exe'), 'exe', executable)
+    assert os.access(str(path), os.X_OK)
+    assert cache.lookup(make_key('exe'), 'exe') == path
+
+def test_eviction(tmpdir):
+    """Check that least recently used entries are evicted."""
+    cache = CompilationCache(tmpdir, max_size=20)
+    keys = [make_key(str(i)) for i in range(3)]
+
+    cache.store(keys[0], 'o', b'0' * 8)
+    cache.store(keys[1], 'o', b'1' * 8)
+    os.utime(str(cache.path(keys[0], 'o')), (0, 0))
+    os.utime(str(cache.path(keys[1], 'o')), (1, 1))
+    assert cache.load(keys[0], 'o') == b'0' * 8
+
+    cache.store(keys[2], 'o', b'2' * 8)
+    assert cache.lookup(keys[1], 'o') is None
+    assert cache.lookup(keys[0], 'o') is not None
+    assert cache.lookup(keys[2], 'o') is not None
+    assert cache.size() == 16
+
+    cache.clear()
+    assert cache.size() == 0
+
+def test_vanished_entry(tmpdir):
+    """Check that entry, evicted by other process after lookup, is a miss."""
+    cache = CompilationCache(tmpdir.join('cache'))
+    key = make_key('source')
+    path = cache.store(key, 'o', b'object')
+    lookup = cache.lookup
+
+    def evicting_lookup(*args):
+        """Find entry and remove it like other process do."""
+        result = lookup(*args)
+        if result is not None:
+            os.unlink(str(result))
+        return result
+
+    cache.lookup = evicting_lookup
+    assert cache.load(key, 'o') is None
+    cache.store(key, 'o', b'object')
+    assert not cache.copy(key, 'o', tmpdir.join('copy'))
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert not path.exists()
+    cache.clear()
+
+def test_size_tracking(tmpdir, monkeypatch):
+    """Check that directory is scanned only when cache is too big."""
+    cache = CompilationCache(tmpdir, max_size=100)
+    scans = []
+    entries = cache.entries
+    monkeypatch.setattr(cache, 'entries', lambda: scans.append(1) or entries())
+
+    for index in range(10):
+        cache.store(make_key(str(index)), 'o', b'0' * 8)
+    assert len(scans) == 1
+
+    cache.store(make_key('big'), 'o', b'0' * 30)
+    assert len(scans) == 2
+    assert cache.size() <= 100
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for compiler driver."""
+
+import sys
+import json
+import subprocess
+
+from pytest import raises
+
+from .. import driver
+from ..__main__ import main
+
+def test_compile_source():
+    """Check that program is compiled to llvm ir."""
+    backend = driver.compile_source('Print "Hello, World!"\nwrite "!"')
+    llvm = backend.emit_llvm()
+    assert 'Print' in llvm
+    assert 'Write' in llvm
+
+    with raises(SyntaxError):
+        driver.compile_source('Unknown "Hello"')
+
+def test_build(tmpdir):
+    """Check that source file is built."""
+    source = tmpdir.join('hello.bb')
+    source.write('Print "Привет, Мир!"')
+
+    output = driver.build(str(source), emit_type='llvm')
+    assert output == tmpdir.join('hello.ll')
+    assert 'bbmain' in output.read_text()
+
+    output = driver.build(str(source))
+    assert output == tmpdir.join('hello')
+    run = subprocess.run((str(output), ), stdout=subprocess.PIPE, encoding='utf-8', check=True)
+    assert run.stdout == 'Привет, Мир!\n'
+
+def test_main_build(tmpdir, monkeypatch, capsys):
+    """Check build command with time report."""
+    source = tmpdir.join('hello.bb')
+    source.write('Print "Hello"')
+    report = tmpdir.join('report.json')
+
+    monkeypatch.setattr(sys, 'argv', ['llb3d', 'build', str(source), '--emit', 'obj',
+                                      '--time-report', '--time-report-json', str(report)])
+    main()
+    assert tmpdir.join('hello.o').check(file=1)
+    assert 'codegen' in capsys.readouterr().err
+
+    names = [record['name'] for record in json.loads(report.read())['phases']]
+    assert names == ['parse', 'fold', 'codegen', 'optimize', 'emit_object']
+    assert json.loads(report.read())['cache'] is None
+
+def test_main_build_cache_stats(tmpdir, monkeypatch, capsys):
+    """Check that cache statistics are in time report."""
+    source = tmpdir.join('hello.bb')
+    source.write('Print "Hello"')
+    report = tmpdir.join('report.json')
+
+    monkeypatch.setattr(sys, 'argv', ['llb3d', 'build', str(source), '--emit', 'obj',
+                                      '--cache', '--cache-dir', str(tmpdir.join('cache')),
+                                      '--time-report', '--time-report-json', str(report)])
+    main()
+    assert json.loads(report.read())['cache']['hits'] == 0
+    main()
+    stats = json.loads(report.read())['cache']
+    assert stats['hits'] > 0
+    assert stats['entries'] > 0
+    assert 'cache: ' in capsys.readouterr().err
+
+def test_build_many(tmpdir):
+    """Check that many programs are built in parallel."""
+    sources = []
+    for index in range(4):
+        source = tmpdir.join('program{index}.bb'.format(index=index))
+        source.write('Print "Program {index}"'.format(index=index))
+        sources.append(str(source))
+    tmpdir.join('broken.bb').write('Print 10 20')
+    sources.append(str(tmpdir.join('broken.bb')))
+
+    results = {result.source: result for result in driver.build_many(sources, jobs=2)}
+    assert results[sources[-1]].error == "Unexpected INTLIT '20' at 1:10"
+    for index, source in enumerate(sources[:-1]):
+        assert results[source].error is None
+        run = subprocess.run((str(results[source].output), ), stdout=subprocess.PIPE,
+                             encoding='utf-8', check=True)
+        assert run.stdout == 'Program {index}\n'.format(index=index)
+
+    results = list(driver.build_many(sources[:2], 'llvm', {'pipeline': 'fast-compile'}, 2))
+    assert sorted(str(result.output) for result in results) == \
+        [str(tmpdir.join('program0.ll')), str(tmpdir.join('program1.ll'))]
+
+def test_main_build_many(tmpdir, monkeypatch, capsys):
+    """Check build command with many sources."""
+    sources = [str(tmpdir.join('a.bb')), str(tmpdir.join('b.bb'))]
+    for source in sources:
+        with open(source, 'w') as source_file:
+            source_file.write('Print "Hello"')
+
+    monkeypatch.setattr(sys, 'argv', ['llb3d', 'build', '--no-daemon', '--emit', 'obj',
+                                      '-j', '2'] + sources)
+    main()
+    assert tmpdir.join('a.o').check(file=1)
+    assert tmpdir.join('b.o').check(file=1)
+    assert len(capsys.readouterr().out.splitlines()) == 2
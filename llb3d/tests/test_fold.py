@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for constant folding."""
+
+from ..ast import (BinaryOp, UnaryOp, Identifier, IntLiteral, FloatLiteral,
+                   StrLiteral, ProcedureCall, Program)
+from ..fold import fold_constants, round_float
+
+def fold(op, left, right): #pylint: disable=invalid-name
+    """Fold binary operator of literals."""
+    return fold_constants(BinaryOp(op, left, right))
+
+def test_int():
+    """Check int32 arithmetic."""
+    assert fold('+', IntLiteral(2147483647), IntLiteral(1)) == IntLiteral(-2147483648)
+    assert fold('/', IntLiteral(7), IntLiteral(-2)) == IntLiteral(-3)
+    assert fold('Mod', IntLiteral(-7), IntLiteral(3)) == IntLiteral(-1)
+    assert fold('Shl', IntLiteral(1), IntLiteral(31)) == IntLiteral(-2147483648)
+    assert fold('Shr', IntLiteral(-1), IntLiteral(28)) == IntLiteral(15)
+    assert fold('Sar', IntLiteral(-16), IntLiteral(2)) == IntLiteral(-4)
+    assert fold('Xor', IntLiteral(6), IntLiteral(3)) == IntLiteral(5)
+    assert fold('<', IntLiteral(1), IntLiteral(2)) == IntLiteral(1)
+    assert fold_constants(UnaryOp('-', IntLiteral(-2147483648))) == IntLiteral(-2147483648)
+    assert fold_constants(UnaryOp('Not', IntLiteral(5))) == IntLiteral(0)
+
+def test_float():
+    """Check float32 arithmetic and int promotion."""
+    assert fold('+', FloatLiteral(0.1), IntLiteral(1)) == FloatLiteral(round_float(1.1))
+    assert fold('/', IntLiteral(1), FloatLiteral(4.0)) == FloatLiteral(0.25)
+    assert fold('^', IntLiteral(2), IntLiteral(10)) == FloatLiteral(1024.0)
+    assert fold('Mod', FloatLiteral(5.5), IntLiteral(2)) == FloatLiteral(1.5)
+    assert fold('=', FloatLiteral(0.1), FloatLiteral(round_float(0.1))) == IntLiteral(1)
+
+def test_string():
+    """Check string concatenation and comparison."""
+    assert fold('+', StrLiteral('a'), StrLiteral('b')) == StrLiteral('ab')
+    assert fold('+', StrLiteral('n='), IntLiteral(5)) == StrLiteral('n=5')
+    assert fold('<>', StrLiteral('a'), StrLiteral('b')) == IntLiteral(1)
+    assert fold('-', StrLiteral('a'), StrLiteral('b')) == BinaryOp('-', StrLiteral('a'),
+                                                                    StrLiteral('b'))
+
+def test_not_folded():
+    """Check that runtime errors and unknown values are kept."""
+    for tree in (BinaryOp('/', IntLiteral(1), IntLiteral(0)),
+                 BinaryOp('Mod', IntLiteral(1), IntLiteral(0)),
+                 BinaryOp('/', IntLiteral(-2147483648), IntLiteral(-1)),
+                 BinaryOp('Mod', IntLiteral(-2147483648), IntLiteral(-1)),
+                 BinaryOp('/', FloatLiteral(1.0), IntLiteral(0)),
+                 BinaryOp('^', FloatLiteral(-8.0), FloatLiteral(0.5)),
+                 BinaryOp('+', Identifier('x'), IntLiteral(1))):
+        assert fold_constants(tree) is tree
+
+def test_nested():
+    """Check folding of nested expressions and Const propagation."""
+    expression = BinaryOp('*', BinaryOp('+', Identifier('SIZE'), IntLiteral(1)),
+                          UnaryOp('-', IntLiteral(2)))
+    program = Program((ProcedureCall(Identifier('Print'), (expression, Identifier('size'))),))
+    assert fold_constants(program, {'Size': IntLiteral(3)}) == \
+        Program((ProcedureCall(Identifier('Print'), (IntLiteral(-8), IntLiteral(3))),))
@@ -127,3 +127,31 @@ def test_small_program():
     lexems = tuple(lexer.get_lexer(code))
 
     assert decode == lexems
+
+def test_single_pass():
+    """Check that tokens are produced before the error is raised."""
+    stream = lexer.get_lexer('10 ? 20')
+    assert next(stream) == EqToken('INTLIT', 10)
+    assert next(stream) == EqToken('INTLIT', 20)
+    with raises(SyntaxError) as exc:
+        next(stream)
+    assert exc.value.msg == "Illegal character '?' at 1:4"
+
+def test_clone():
+    """Check that every lexer is a clone of master lexer."""
+    first = lexer.init_lexer('alpha')
+    second = lexer.init_lexer('beta')
+    assert first is not second
+    assert first.lexre is second.lexre
+    assert first.globals is not second.globals
+    assert next(lexer.TokenStream(second)) == EqToken('ID', 'beta')
+    assert next(lexer.TokenStream(first)) == EqToken('ID', 'alpha')
+
+def test_lextab(tmpdir):
+    """Check that optimized lexer tables are saved."""
+    try:
+        lexer.build_lexer(optimize=True, outputdir=tmpdir)
+        assert tmpdir.join('lextab.py').check(file=1)
+        assert tuple(lexer.get_lexer('For')) == (EqToken('FOR', 'For'), )
+    finally:
+        lexer.build_lexer()
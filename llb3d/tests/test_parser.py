@@ -2,9 +2,14 @@
 
 """Tests for Blitz3D parser."""
 
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from pytest import raises
 
-from .. import parser, ast
+from .. import parser, ast, lexer
+from ..cache import CompilationCache
 
 
 def single_statement(instruction: ast.Statement) -> ast.Program:
@@ -51,3 +56,105 @@ def test_error():
     with raises(SyntaxError) as exc:
         parser.get_ast('Hello 10,')
     assert exc.value.msg == "Unexpected EOF"
+
+    with raises(SyntaxError) as exc:
+        parser.get_ast('Print -1')
+    assert exc.value.msg == "Unexpected - '-' at 1:7"
+
+def test_empty_lines():
+    """Check that empty lines are skipped."""
+    assert parser.get_ast('') == ast.Program(tuple())
+    assert parser.get_ast('\n10\n\n20\n') == ast.Program((ast.IntLiteral(10),
+                                                          ast.IntLiteral(20)))
+
+def test_lex_error():
+    """Check that lex errors are raised by parser."""
+    with raises(SyntaxError) as exc:
+        parser.get_ast('Print ?')
+    assert exc.value.msg == "Illegal character '?' at 1:7"
+
+def test_many_statements():
+    """Check that long programs are parsed."""
+    count = 2000
+    code = '\n'.join('Print "{i}", {i}'.format(i=i) for i in range(count))
+    program = parser.get_ast(code)
+    assert len(program['statements']) == count
+    assert program['statements'][-1] == ast.ProcedureCall(ast.Identifier('Print'),
+                                                          (ast.StrLiteral(str(count - 1)),
+                                                           ast.IntLiteral(count - 1)))
+
+def test_interner():
+    """Check that parser shares equal subtrees."""
+    interner = ast.Interner()
+    program = parser.get_ast('Print x, x\nPrint x, x', interner=interner)
+    first, second = program['statements']
+    assert first is second
+    assert first['args'][0] is first['args'][1]
+    assert program == parser.get_ast('Print x, x\nPrint x, x')
+
+def test_ast_cache(tmpdir):
+    """Check that parsed tree is loaded from cache."""
+    cache = CompilationCache(str(tmpdir))
+    code = 'Print "Hello", 1.5\nWrite 10'
+    tree = parser.get_ast(code, cache=cache)
+    assert cache.stats()['entries'] == 1
+
+    assert parser.get_ast(code, cache=cache) == tree
+    assert cache.hits == 1
+
+    cache.path(parser.ast_cache_key(code), 'ast').write_bytes(b'broken')
+    assert parser.get_ast(code, cache=cache) == tree
+    assert parser.get_ast(code, cache=cache) == tree
+    assert cache.hits == 3
+
+def test_parser_instances():
+    """Check that parsers have own state and share parse tables."""
+    first, second = parser.Parser(), parser.Parser()
+    assert first.lr_parser.action is second.lr_parser.action
+    with raises(SyntaxError):
+        first.parse('10 20')
+    assert second.parse('10') == single_statement(ast.IntLiteral(10))
+    assert first.parse('20') == single_statement(ast.IntLiteral(20))
+
+def test_threads():
+    """Check that concurrent parsers don't mix errors."""
+    def parse(index):
+        """Parse broken or valid source."""
+        try:
+            parser.get_ast('{index} {index}'.format(index=index) if index % 2 else
+                           'Print {index}'.format(index=index))
+        except SyntaxError as error:
+            return error.msg
+        return None
+
+    with ThreadPoolExecutor(8) as executor:
+        messages = list(executor.map(parse, range(200)))
+    for index, message in enumerate(messages):
+        if index % 2:
+            assert message == "Unexpected INTLIT '{index}' at 1:{column}".format(
+                index=index, column=len(str(index)) + 2)
+        else:
+            assert message is None
+
+def test_parse_many():
+    """Check parsing in thread and process pools."""
+    sources = ['Print {index}'.format(index=index) for index in range(20)]
+    expected = [parser.get_ast(source) for source in sources]
+    assert parser.parse_many(sources, workers=4) == expected
+    assert parser.parse_many(sources, workers=2, processes=True) == expected
+
+    with raises(SyntaxError):
+        parser.parse_many(['Print 1', '1 2'], workers=2, processes=True)
+
+def test_fresh_tables(tmpdir):
+    """Check that tables are used only if they are newer than grammar."""
+    parser.get_master_parser()
+    source = tmpdir.join('grammar.py')
+    source.write('')
+    os.utime(str(source), (0, 0))
+    assert lexer.fresh_tables(parser.PARSETAB, str(source))
+    assert not lexer.fresh_tables('llb3d.missingtab', str(source))
+
+    future = time.time() + 10 ** 6
+    os.utime(str(source), (future, future))
+    assert not lexer.fresh_tables(parser.PARSETAB, str(source))
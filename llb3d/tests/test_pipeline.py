@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for optimization pipelines."""
+
+from llvmlite import binding
+
+from ..backend import Backend
+from ..pipeline import Pipeline, PIPELINES
+
+def test_presets():
+    """Check that all presets optimize module."""
+    for name in ('fast-compile', 'balanced', 'max-speed', 'min-size'):
+        backend = Backend()
+        backend.pipeline = PIPELINES[name]
+        assert isinstance(backend.optimize(), binding.ModuleRef)
+        assert 'bbmain' in backend.emit_assembly()
+
+def test_replace():
+    """Check that replace doesn't change original pipeline."""
+    pipeline = Pipeline(opt_level=3, slp_vectorize=True)
+    other = pipeline.replace(opt_level=1)
+    assert pipeline.opt_level == 3
+    assert other.opt_level == 1
+    assert other.slp_vectorize
+    assert pipeline.key() != other.key()
+    assert pipeline.key() == pipeline.replace().key()
+
+def test_stages():
+    """Check that stages can be disabled."""
+    backend = Backend()
+    backend.pipeline = Pipeline(function_passes=False, module_passes=False)
+    backend.time_passes = True
+    backend.optimize()
+    assert backend.pass_timings['function'] == 0.0
+    assert backend.pass_timings['module'] == 0.0
+
+def test_time_passes():
+    """Check that pass timings are reported."""
+    backend = Backend()
+    backend.optimize()
+    assert backend.pass_timings is None
+
+    backend = Backend()
+    backend.time_passes = True
+    backend.optimize()
+    assert backend.pass_timings['module'] > 0.0
+    if hasattr(binding, 'set_time_passes'):
+        assert 'Pass execution timing report' in backend.pass_timings['passes']
+
+def test_time_passes_unsupported(monkeypatch):
+    """Check that optimization works without pass timing of llvmlite < 0.37."""
+    monkeypatch.delattr(binding, 'set_time_passes', raising=False)
+    backend = Backend()
+    backend.time_passes = True
+    backend.optimize()
+    assert backend.pass_timings['module'] > 0.0
+    assert backend.pass_timings['passes'] == ''
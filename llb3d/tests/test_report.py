@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for compile-phase report."""
+
+import json
+import tracemalloc
+
+from .. import parser
+from ..backend import Backend
+from ..report import Report, ReportProvider, phase
+
+def test_no_report():
+    """Check that phase without report does nothing."""
+    with phase('nothing'):
+        pass
+
+def test_nested_phases():
+    """Check that nested phases are recorded with depth."""
+    report = Report(trace_memory=True)
+    with ReportProvider(report):
+        with phase('outer'):
+            with phase('inner'):
+                data = [0] * 100000
+            del data
+
+    assert not tracemalloc.is_tracing()
+
+    outer, inner = report.records
+    assert (outer['name'], outer['depth']) == ('outer', 0)
+    assert (inner['name'], inner['depth']) == ('inner', 1)
+    assert outer['wall'] >= inner['wall']
+    assert inner['peak_memory'] >= 100000 * 8
+    assert outer['peak_memory'] >= inner['peak_memory']
+
+    assert report.as_dict()['total']['wall'] == outer['wall']
+    assert json.loads(report.to_json())['phases'][1]['name'] == 'inner'
+    assert 'inner' in str(report)
+
+def test_without_reset_peak(monkeypatch):
+    """Check that memory is traced on python without tracemalloc.reset_peak."""
+    monkeypatch.delattr(tracemalloc, 'reset_peak', raising=False)
+    report = Report(trace_memory=True)
+    with ReportProvider(report):
+        with phase('outer'):
+            with phase('inner'):
+                data = [0] * 100000
+            del data
+
+    outer, inner = report.records
+    assert inner['peak_memory'] >= 100000 * 8
+    assert outer['peak_memory'] >= inner['peak_memory']
+
+def test_compiler_phases():
+    """Check that compiler phases are recorded."""
+    report = Report()
+    with ReportProvider(report):
+        backend = Backend()
+        backend.compile(parser.get_ast('Print "Hello"'))
+        backend.emit_assembly()
+
+    names = [record['name'] for record in report.records]
+    assert names == ['parse', 'codegen', 'optimize', 'emit_assembly']
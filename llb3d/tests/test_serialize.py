@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for binary AST format."""
+
+from random import Random
+
+from pytest import raises
+
+from .. import ast, parser
+from ..serialize import dumps, loads, load
+
+CODE = 'Print "Hello", 10, 1.5\nWrite "Привет"\nPrint "Hello", 10, 2.0\n'
+
+def test_round_trip():
+    """Check that tree is the same after loading in both validation modes."""
+    tree = parser.get_ast(CODE)
+    data = dumps(tree)
+    assert loads(data) == tree
+
+    validation = ast.get_validation()
+    try:
+        ast.set_validation(False)
+        loaded = loads(data)
+    finally:
+        ast.set_validation(validation)
+    assert loaded == tree
+    assert str(loaded) == str(tree)
+    assert hash(loaded) == hash(tree)
+
+def test_sharing():
+    """Check that shared subtrees are written once and stay shared."""
+    interner = ast.Interner()
+    tree = parser.get_ast(CODE, interner)
+    assert len(dumps(tree)) < len(dumps(parser.get_ast(CODE)))
+
+    loaded = loads(dumps(tree))
+    assert loaded['statements'][0]['procedure'] is loaded['statements'][2]['procedure']
+
+    other = ast.Interner()
+    loaded = loads(dumps(tree), other)
+    assert other.intern(ast.StrLiteral('Hello')) is loaded['statements'][0]['args'][0]
+
+def test_mmap(tmpdir):
+    """Check loading from file."""
+    tree = parser.get_ast(CODE)
+    path = tmpdir.join('tree.ast')
+    path.write_binary(dumps(tree))
+    assert load(str(path)) == tree
+
+    path.write_binary(b'')
+    with raises(ValueError):
+        load(str(path))
+
+def test_corrupted():
+    """Check that invalid data raises ValueError."""
+    data = dumps(parser.get_ast(CODE))
+    for broken in (b'', b'NOTANAST', data[:-1], data + b'\0',
+                   data.replace(b'Program', b'Unknown')):
+        with raises(ValueError):
+            loads(broken)
+
+def test_byte_flips():
+    """Check that every damaged byte is detected in both validation modes."""
+    data = dumps(parser.get_ast(CODE))
+    random = Random(0)
+    previous = ast.get_validation()
+    try:
+        for validation in (True, False):
+            ast.set_validation(validation)
+            for _ in range(200):
+                broken = bytearray(data)
+                broken[random.randrange(len(data))] ^= random.randrange(1, 256)
+                with raises(ValueError):
+                    loads(bytes(broken))
+    finally:
+        ast.set_validation(previous)
+
+def test_ill_typed():
+    """Check that ill-typed nodes raise ValueError with validation."""
+    previous = ast.get_validation()
+    try:
+        ast.set_validation(False)
+        data = dumps(ast.IntLiteral('10'))
+        ast.set_validation(True)
+        with raises(ValueError):
+            loads(data)
+    finally:
+        ast.set_validation(previous)
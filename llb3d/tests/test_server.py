@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for compiler daemon."""
+
+import sys
+import pathlib
+import subprocess
+import threading
+
+from pytest import fixture, raises
+
+from .. import client
+from ..__main__ import main
+from ..backend import Backend
+from ..server import CompilerServer
+
+@fixture(name='server')
+def server_fixture(tmpdir):
+    """Run daemon in a thread."""
+    compiler_server = CompilerServer(str(tmpdir.join('llb3d.sock')))
+    thread = threading.Thread(target=compiler_server.serve)
+    thread.start()
+    yield compiler_server
+
+    connection = client.connect(compiler_server.path)
+    if connection is not None:
+        with connection:
+            connection.request('shutdown')
+    thread.join()
+
+def test_requests(server, tmpdir):
+    """Check build, compile and error responses."""
+    source = tmpdir.join('hello.bb')
+    source.write('Print "Hello"')
+
+    with client.connect(server.path) as connection:
+        response = connection.request('build', source=str(source), output=None, emit='llvm',
+                                      options={'pipeline': 'fast-compile'})
+        assert response == {'status': 'ok', 'output': str(tmpdir.join('hello.ll'))}
+        assert 'bbmain' in tmpdir.join('hello.ll').read()
+
+        directory = tmpdir.mkdir('program')
+        response = connection.request('compile', source=str(source), options={},
+                                      directory=str(directory))
+        assert response['status'] == 'ok'
+        run = subprocess.run((response['executable'], ), stdout=subprocess.PIPE,
+                             encoding='utf-8', check=True)
+        assert run.stdout == 'Hello\n'
+
+        response = connection.request('compile', source=str(source), options={},
+                                      directory=str(directory), jit=True)
+        assert response['status'] == 'ok'
+        assert response['unit_objects'] == []
+        backend = Backend()
+        backend.load_optimized(pathlib.Path(response['bitcode']).read_bytes())
+        run = backend.run_jit(stdout=subprocess.PIPE, encoding='utf-8')
+        assert run.stdout == 'Hello\n'
+
+        source.write('Print 10 20')
+        response = connection.request('build', source=str(source), options={})
+        assert response['type'] == 'SyntaxError'
+        assert response['message'] == "Unexpected INTLIT '20' at 1:10"
+
+        assert connection.request('unknown')['status'] == 'error'
+    assert server.request_count == 6
+
+    with raises(RuntimeError):
+        CompilerServer(server.path)
+
+def test_main(server, tmpdir, monkeypatch, capfd):
+    """Check that command line uses running daemon."""
+    source = tmpdir.join('hello.bb')
+    source.write('Print "Hello"')
+
+    monkeypatch.setattr(sys, 'argv', ['llb3d', 'build', str(source), '--emit', 'llvm',
+                                      '--socket', str(server.path)])
+    main()
+    assert tmpdir.join('hello.ll').check(file=1)
+    assert server.request_count == 2
+
+    monkeypatch.setattr(sys, 'argv', ['llb3d', 'run', '--socket', str(server.path),
+                                      str(source)])
+    with raises(SystemExit) as exit_info:
+        main()
+    assert exit_info.value.code == 0
+    assert capfd.readouterr().out == 'Hello\n'
+    assert server.request_count == 4
+
+    monkeypatch.setattr(sys, 'argv', ['llb3d', 'run', '--socket', str(server.path), '--jit',
+                                      str(source)])
+    with raises(SystemExit) as exit_info:
+        main()
+    assert exit_info.value.code == 0
+    assert capfd.readouterr().out == 'Hello\n'
+    assert server.request_count == 6
+
+def test_no_daemon(tmpdir):
+    """Check that missing daemon is detected."""
+    assert client.connect(str(tmpdir.join('missing.sock'))) is None
+    tmpdir.join('stale.sock').write('')
+    assert client.connect(str(tmpdir.join('stale.sock'))) is None
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for separately compiled includes."""
+
+import subprocess
+
+from pytest import raises
+
+from .. import backend as backend_module, driver, units
+from ..backend import Backend
+from ..cache import CompilationCache
+from ..report import Report, ReportProvider
+
+def write_library(tmpdir):
+    """Create library with nested and repeated includes."""
+    tmpdir.mkdir('lib')
+    tmpdir.join('lib', 'a.bb').write('Include "b.bb"\nPrint "a"')
+    tmpdir.join('lib', 'b.bb').write('Print "b"')
+    tmpdir.join('main.bb').write('Print "main"\nInclude "lib/a.bb"\nInclude "lib/b.bb"')
+
+def test_load_unit(tmpdir):
+    """Check include graph and keys."""
+    write_library(tmpdir)
+    unit = units.load_unit(tmpdir.join('main.bb').read(), str(tmpdir))
+    assert list(unit.includes) == ['lib/a.bb', 'lib/b.bb']
+    assert unit.includes['lib/a.bb'].includes['b.bb'] is unit.includes['lib/b.bb']
+    assert [included.filename.name for included in unit.walk()[:-1]] == ['b.bb', 'a.bb']
+
+    tmpdir.join('lib', 'b.bb').write('Print "changed"')
+    changed = units.load_unit(tmpdir.join('main.bb').read(), str(tmpdir))
+    assert changed.includes['lib/a.bb'].key != unit.includes['lib/a.bb'].key
+
+def test_build(tmpdir):
+    """Check that included units run at include point."""
+    write_library(tmpdir)
+    output = driver.build(str(tmpdir.join('main.bb')))
+    run = subprocess.run((str(output), ), stdout=subprocess.PIPE, encoding='utf-8', check=True)
+    assert run.stdout == 'main\nb\na\nb\n'
+
+    backend = driver.compile_source(tmpdir.join('main.bb').read(), directory=str(tmpdir))
+    assert len(backend.unit_objects) == 2
+    run = backend.run_jit(stdout=subprocess.PIPE, encoding='utf-8')
+    assert run.stdout == 'main\nb\na\nb\n'
+
+def test_relink(tmpdir):
+    """Check that unchanged units are taken from cache."""
+    write_library(tmpdir)
+    cache = CompilationCache(str(tmpdir.join('cache')))
+
+    def build():
+        """Build main program and return names of recorded phases."""
+        backend = Backend()
+        backend.cache = cache
+        report = Report()
+        with ReportProvider(report):
+            output = driver.build(str(tmpdir.join('main.bb')), backend=backend)
+        run = subprocess.run((str(output), ), stdout=subprocess.PIPE, encoding='utf-8',
+                             check=True)
+        return [record['name'] for record in report.records], run.stdout
+
+    phases, _ = build()
+    assert phases.count('unit') == 2
+
+    tmpdir.join('main.bb').write('Print "new main"\nInclude "lib/a.bb"')
+    phases, stdout = build()
+    assert 'unit' not in phases
+    assert stdout == 'new main\nb\na\n'
+
+    tmpdir.join('lib', 'b.bb').write('Print "new b"')
+    phases, stdout = build()
+    assert phases.count('unit') == 2
+    assert stdout == 'new main\nnew b\na\n'
+
+def test_errors(tmpdir):
+    """Check missing, recursive and broken includes."""
+    with raises(SyntaxError) as exc:
+        driver.compile_source('Include "missing.bb"', directory=str(tmpdir))
+    assert exc.value.msg == "Include file 'missing.bb' is not found"
+
+    tmpdir.join('self.bb').write('Include "self.bb"')
+    with raises(SyntaxError) as exc:
+        driver.compile_source('Include "self.bb"', directory=str(tmpdir))
+    assert exc.value.msg == "Recursive include of 'self.bb'"
+
+    tmpdir.join('broken.bb').write('Print 10 20')
+    with raises(SyntaxError) as exc:
+        driver.compile_source('Include "broken.bb"', directory=str(tmpdir))
+    assert exc.value.msg == "{filename}: Unexpected INTLIT '20' at 1:10".format(
+        filename=tmpdir.join('broken.bb'))
+
+    with raises(SyntaxError):
+        Backend().compile_statement(units.parser.get_ast('Include "lib.bb"')['statements'][0])
+
+def test_lto(tmpdir, monkeypatch):
+    """Check that included units are linked into module with lto."""
+    write_library(tmpdir)
+    # Runtime bitcode is optional, units are linked before it
+    monkeypatch.setattr(backend_module, 'link_runtime', lambda llvm_module: None)
+    backend = Backend()
+    backend.lto = True
+    driver.compile_source(tmpdir.join('main.bb').read(), backend, str(tmpdir))
+    assert backend.unit_objects == []
+    assert len(backend.unit_modules) == 2
+
+    definitions = [line for line in backend.emit_llvm().splitlines()
+                   if line.startswith('define')]
+    assert len(definitions) == 3
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for AST visitor and transformer."""
+
+from .. import ast, parser
+from ..visitor import NodeVisitor, NodeTransformer, SKIP_CHILDREN, iter_child_nodes
+
+class Collector(NodeVisitor):
+    """Collect class names of visited nodes."""
+
+    def __init__(self):
+        """Initialize self.  See help(type(self)) for accurate signature."""
+        self.names = []
+
+    def generic_visit(self, node):
+        """Collect node class name."""
+        self.names.append(type(node).__name__)
+
+    def visit_Literal(self, node): #pylint: disable=invalid-name
+        """Collect literal value."""
+        self.names.append(node['value'])
+
+    def visit_BinaryOp(self, node): #pylint: disable=invalid-name
+        """Don't visit operands."""
+        self.names.append(node['op'])
+        return SKIP_CHILDREN
+
+class Increment(NodeTransformer):
+    """Increment integer literals."""
+
+    def visit_IntLiteral(self, node): #pylint: disable=invalid-name
+        """Return incremented literal."""
+        return ast.IntLiteral(node['value'] + 1)
+
+def deep_expression(depth):
+    """Create left-deep chain of unary operators."""
+    expression = ast.IntLiteral(0)
+    for _ in range(depth):
+        expression = ast.UnaryOp('-', expression)
+    return expression
+
+def test_iter_child_nodes():
+    """Check that child nodes are found in fields and tuples."""
+    call = ast.ProcedureCall(ast.Identifier('Print'), (ast.IntLiteral(1), ast.IntLiteral(2)))
+    assert tuple(iter_child_nodes(call)) == (ast.Identifier('Print'),
+                                             ast.IntLiteral(1), ast.IntLiteral(2))
+
+def test_visitor_order():
+    """Check pre-order, dispatch by base class and skipped children."""
+    collector = Collector()
+    collector.visit(parser.get_ast('Print "a", 10\nWrite 1.5'))
+    assert collector.names == ['Program', 'ProcedureCall', 'Identifier', 'a', 10,
+                               'ProcedureCall', 'Identifier', 1.5]
+
+    collector = Collector()
+    collector.visit(ast.BinaryOp('+', ast.IntLiteral(1), ast.IntLiteral(2)))
+    assert collector.names == ['+']
+
+def test_transformer_sharing():
+    """Check that untouched subtrees are shared."""
+    program = parser.get_ast('Print "a"\nPrint 10')
+    result = Increment().visit(program)
+    assert result == parser.get_ast('Print "a"\nPrint 11')
+    assert result['statements'][0] is program['statements'][0]
+    assert result['statements'][1] is not program['statements'][1]
+
+    unchanged = parser.get_ast('Print "a"')
+    assert Increment().visit(unchanged) is unchanged
+
+def test_changed_shared_subtree():
+    """Check that changed shared subtree is transformed once and stays shared."""
+    class Rename(NodeTransformer):
+        """Rename identifiers and count calls."""
+
+        def __init__(self):
+            """Initialize self.  See help(type(self)) for accurate signature."""
+            self.calls = 0
+
+        def visit_Identifier(self, node): #pylint: disable=invalid-name
+            """Return upper case identifier."""
+            self.calls += 1
+            return node.replace(name=node['name'].upper())
+
+    shared = ast.UnaryOp('-', ast.Identifier('a'))
+    transformer = Rename()
+    result = transformer.visit(ast.BinaryOp('*', shared, shared))
+    assert result == ast.BinaryOp('*', ast.UnaryOp('-', ast.Identifier('A')),
+                                  ast.UnaryOp('-', ast.Identifier('A')))
+    assert transformer.calls == 1
+    assert result['left'] is result['right']
+
+def test_deep_tree():
+    """Check that deep trees don't overflow the stack."""
+    depth = 20000
+    collector = Collector()
+    collector.visit(deep_expression(depth))
+    assert len(collector.names) == depth + 1
+
+    result = Increment().visit(deep_expression(depth))
+    for _ in range(depth):
+        result = result['right']
+    assert result['value'] == 1
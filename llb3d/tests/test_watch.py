@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for watch mode."""
+
+import io
+import os
+import subprocess
+
+from ..report import Report, ReportProvider
+from ..watch import Watcher
+
+def write(path, code, mtime):
+    """Write file with given modification time."""
+    path.write(code)
+    os.utime(str(path), ns=(mtime, mtime))
+
+def test_watcher(tmpdir):
+    """Check that only changed units are rebuilt."""
+    tmpdir.mkdir('lib')
+    write(tmpdir.join('lib', 'a.bb'), 'Print "a"', 1)
+    write(tmpdir.join('main.bb'), 'Print "main"\nInclude "lib/a.bb"', 1)
+    watcher = Watcher(str(tmpdir.join('main.bb')),
+                      {'cache_dir': str(tmpdir.join('cache'))})
+
+    def step():
+        """Rebuild and rerun program, return recorded phases and output."""
+        report = Report()
+        with ReportProvider(report):
+            rebuilt = watcher.build()
+        run = watcher.run(stdout=subprocess.PIPE, encoding='utf-8')
+        return rebuilt, [record['name'] for record in report.records], run.stdout
+
+    rebuilt, phases, stdout = step()
+    assert rebuilt
+    assert phases.count('unit') == 1
+    assert stdout == 'main\na\n'
+    assert [path.name for path in watcher.dependencies()] == ['main.bb', 'a.bb']
+    assert watcher.output == tmpdir.join('main')
+    assert not watcher.changed()
+
+    write(tmpdir.join('main.bb'), 'Print "main"\nInclude "lib/a.bb"', 2)
+    assert watcher.changed()
+    rebuilt, phases, stdout = step()
+    assert not rebuilt
+    assert stdout == 'main\na\n'
+
+    write(tmpdir.join('main.bb'), 'Print "new main"\nInclude "lib/a.bb"', 3)
+    rebuilt, phases, stdout = step()
+    assert rebuilt
+    assert 'unit' not in phases
+    assert stdout == 'new main\na\n'
+
+    write(tmpdir.join('lib', 'a.bb'), 'Print "new a"', 4)
+    assert watcher.changed()
+    rebuilt, phases, stdout = step()
+    assert rebuilt
+    assert phases.count('unit') == 1
+    assert stdout == 'new main\nnew a\n'
+
+def test_errors(tmpdir):
+    """Check that files are watched after syntax and compilation errors."""
+    write(tmpdir.join('a.bb'), 'Print "a"', 1)
+    write(tmpdir.join('main.bb'), 'Include "a.bb"', 1)
+    watcher = Watcher(str(tmpdir.join('main.bb')),
+                      {'cache_dir': str(tmpdir.join('cache'))}, jit=True)
+    stream = io.StringIO()
+    assert watcher.step(stream).returncode == 0
+    assert '[rebuilt' in stream.getvalue()
+
+    write(tmpdir.join('a.bb'), 'Print', 2)
+    stream = io.StringIO()
+    assert watcher.step(stream) is None
+    assert stream.getvalue().startswith('{main}: '.format(main=tmpdir.join('main.bb')))
+    assert not watcher.changed()
+
+    write(tmpdir.join('a.bb'), 'Print 2', 3)
+    stream = io.StringIO()
+    assert watcher.step(stream) is None
+    assert 'NotImplementedError' in stream.getvalue()
+
+    write(tmpdir.join('a.bb'), 'Print "fixed"', 4)
+    assert watcher.changed()
+    assert watcher.build()
+    assert watcher.run(stdout=subprocess.PIPE, encoding='utf-8').stdout == 'fixed\n'
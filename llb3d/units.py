@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+"""Separate compilation of included files.
+
+Every source file is a compilation unit. Included unit is compiled into
+its own entry function and object file, Include statement calls the entry.
+Unit key is a hash of unit code and keys of its includes, so object of
+included unit is taken from cache, while unit and its includes are
+unchanged, and is relinked with changed including unit.
+"""
+
+import pathlib
+
+from . import ast, parser
+from .backend import Backend, TargetOptions
+from .cache import make_key
+from .fold import fold_constants
+from .report import phase
+from .visitor import NodeVisitor, SKIP_CHILDREN
+
+INCLUDE_ENTRY_PREFIX = 'bbinclude_'
+
+class Unit:
+
+    """Parsed source file with its includes."""
+
+    def __init__(self, code: str, tree: ast.Program, filename=None):
+        """See help(type(obj))."""
+        self.code = code
+        self.tree = tree
+        self.filename = filename
+        # Include path -> unit
+        self.includes = {}
+        self.key = None
+
+    @property
+    def entry_name(self) -> str:
+        """Return name of entry function of included unit."""
+        return INCLUDE_ENTRY_PREFIX + self.key[:16]
+
+    def walk(self) -> list:
+        """Return unit and all included units, every unit after its includes."""
+        result = []
+        seen = set()
+        stack = [(self, False)]
+        while stack:
+            unit, expanded = stack.pop()
+            if expanded:
+                result.append(unit)
+            elif unit.key not in seen:
+                seen.add(unit.key)
+                stack.append((unit, True))
+                stack.extend((child, False) for child in reversed(tuple(unit.includes.values())))
+        return result
+
+class IncludeFinder(NodeVisitor):
+
+    """Collect include paths in order of appearance."""
+
+    def __init__(self):
+        """See help(type(obj))."""
+        self.paths = []
+
+    def visit_Include(self, node): #pylint: disable=invalid-name
+        """Collect include path."""
+        if node['path'] not in self.paths:
+            self.paths.append(node['path'])
+        return SKIP_CHILDREN
+
+    def visit_Expression(self, _node): #pylint: disable=invalid-name
+        """Expressions have no includes."""
+        return SKIP_CHILDREN
+
+def find_includes(tree: ast.Program) -> list:
+    """Return include paths of the tree."""
+    finder = IncludeFinder()
+    finder.visit(tree)
+    return finder.paths
+
+def load_unit(code: str, directory='.', cache=None, filename=None, _loading=None,
+              _loaded=None) -> Unit:
+    """Parse code and all included files.
+
+    Include paths are relative to directory of including file.
+    Every file is loaded once, recursive include raises SyntaxError.
+    """
+    loading = set() if _loading is None else _loading
+    loaded = {} if _loaded is None else _loaded
+
+    try:
+        tree = parser.get_ast(code, cache=cache)
+    except SyntaxError as error:
+        if filename is None:
+            raise
+        raise SyntaxError('{filename}: {error}'.format(filename=filename, error=error.msg)) \
+            from None
+
+    unit = Unit(code, tree, filename)
+    for path in find_includes(tree):
+        include_filename = (pathlib.Path(directory) / path).resolve()
+        if include_filename in loading:
+            raise SyntaxError("Recursive include of '{path}'".format(path=path))
+        if include_filename not in loaded:
+            try:
+                with open(include_filename, encoding='utf-8') as source:
+                    include_code = source.read()
+            except FileNotFoundError:
+                raise SyntaxError("Include file '{path}' is not found".format(path=path)) \
+                    from None
+
+            loading.add(include_filename)
+            loaded[include_filename] = load_unit(include_code, include_filename.parent, cache,
+                                                 include_filename, loading, loaded)
+            loading.discard(include_filename)
+        unit.includes[path] = loaded[include_filename]
+
+    unit.key = make_key(code, *(include.key for include in unit.includes.values()))
+    return unit
+
+def compile_unit(unit: Unit, backend: Backend) -> Backend:
+    """Compile unit into backend and included units into backend unit objects.
+
+    With lto llvm ir of included units is linked into program module,
+    so runtime is inlined into included units too.
+    """
+    included_units = unit.walk()[:-1]
+    if backend.lto:
+        backend.unit_modules = []
+        for included in included_units:
+            with phase('unit'):
+                unit_backend = compile_included_unit(included, backend)
+            backend.unit_modules.append(str(unit_backend.source_module))
+    else:
+        backend.unit_objects = [emit_included_unit(included, backend)
+                                for included in included_units]
+    backend.includes = {path: included.entry_name for path, included in unit.includes.items()}
+
+    with phase('fold'):
+        tree = fold_constants(unit.tree)
+    backend.compile(tree)
+    return backend
+
+def compile_included_unit(unit: Unit, backend: Backend) -> Backend:
+    """Return backend with llvm ir of included unit and backend options."""
+    unit_backend = backend.derive(unit.entry_name)
+    unit_backend.cache = None
+    # Large code model of jit default isn't supported by jit object loader
+    target = unit_backend.target
+    unit_backend.target = TargetOptions(target.triple, target.cpu, target.features,
+                                        target.reloc, 'small', target.opt)
+    unit_backend.includes = {path: included.entry_name
+                             for path, included in unit.includes.items()}
+    with phase('fold'):
+        tree = fold_constants(unit.tree)
+    unit_backend.compile(tree)
+    return unit_backend
+
+def emit_included_unit(unit: Unit, backend: Backend) -> bytes:
+    """Return object of included unit, compiled with backend options.
+
+    Object is cached by unit key, so unit isn't compiled again while
+    it and its includes are unchanged.
+    """
+    if backend.cache is not None:
+        # Unit key covers sources, backend options are added by cache_key
+        key = backend.cache_key(source=unit.key)
+        obj = backend.cache.load(key, 'o')
+        if obj is not None:
+            return obj
+
+    with phase('unit'):
+        obj = compile_included_unit(unit, backend).emit_object()
+
+    if backend.cache is not None:
+        backend.cache.store(key, 'o', obj)
+    return obj
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+"""Iterative visitor and transformer for llb3d AST.
+
+Traversal uses explicit stack, so deep trees don't hit recursion limit.
+Handlers are looked up by node class name (visit_BinaryOp), then by names
+of its base classes (visit_Expression), then generic_visit is used.
+"""
+
+from .ast import FrozenDict
+
+SKIP_CHILDREN = object()
+
+def iter_child_nodes(node: FrozenDict):
+    """Yield child nodes: node fields and nodes inside tuple fields."""
+    for value in node.values():
+        if isinstance(value, FrozenDict):
+            yield value
+        elif isinstance(value, tuple):
+            for item in value:
+                if isinstance(item, FrozenDict):
+                    yield item
+
+class NodeVisitor:
+
+    """Iterative pre-order visitor.
+
+    Handler is called for every node before its children.
+    If handler returns SKIP_CHILDREN, children are not visited.
+
+    >>> from .ast import BinaryOp, Identifier, IntLiteral
+    >>> class Names(NodeVisitor):
+    ...     def __init__(self):
+    ...         self.names = []
+    ...     def visit_Identifier(self, node):
+    ...         self.names.append(node['name'])
+    >>> names = Names()
+    >>> names.visit(BinaryOp('+', Identifier('a'), BinaryOp('*', IntLiteral(2), Identifier('b'))))
+    >>> names.names
+    ['a', 'b']
+    """
+
+    _dispatch_table = {}
+
+    def __init_subclass__(cls, **kwargs):
+        """Create own dispatch table for every visitor class."""
+        super().__init_subclass__(**kwargs)
+        cls._dispatch_table = {}
+
+    @classmethod
+    def get_handler(cls, node_type):
+        """Return handler function for node type, lookup is done once."""
+        handler = cls._dispatch_table.get(node_type)
+        if handler is None:
+            for base in node_type.__mro__:
+                handler = getattr(cls, 'visit_' + base.__name__, None)
+                if handler is not None:
+                    break
+            else:
+                handler = cls.generic_visit
+            cls._dispatch_table[node_type] = handler
+        return handler
+
+    def generic_visit(self, node):
+        """Handle node without own handler."""
+
+    def visit(self, tree: FrozenDict):
+        """Visit all nodes of the tree."""
+        get_handler = self.get_handler
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            if get_handler(type(node))(self, node) is not SKIP_CHILDREN:
+                children = tuple(iter_child_nodes(node))
+                stack.extend(reversed(children))
+
+class NodeTransformer(NodeVisitor):
+
+    """Iterative post-order transformer.
+
+    Handler is called for every node after its children are transformed
+    with the node rebuilt from the new children, and returns replacement.
+    If all children are returned untouched, handler receives the original
+    node, so handler returning its argument keeps the subtree shared.
+    Shared subtrees (see ast.Interner) are transformed once per visit.
+
+    >>> from .ast import BinaryOp, Identifier, IntLiteral
+    >>> class Rename(NodeTransformer):
+    ...     def visit_Identifier(self, node):
+    ...         return node.replace(name=node['name'].upper())
+    >>> Rename().visit(BinaryOp('+', Identifier('a'), IntLiteral(1)))
+    BinaryOp('+', Identifier('A'), IntLiteral(1))
+    """
+
+    def generic_visit(self, node):
+        """Handle node without own handler."""
+        return node
+
+    def visit(self, tree: FrozenDict):
+        """Return transformed tree."""
+        get_handler = self.get_handler
+        memo = {}
+        results = []
+        stack = [(tree, None)]
+        while stack:
+            node, children = stack.pop()
+            if children is None:
+                if id(node) in memo:
+                    results.append(memo[id(node)])
+                    continue
+                children = tuple(iter_child_nodes(node))
+                stack.append((node, children))
+                stack.extend((child, None) for child in reversed(children))
+                continue
+
+            original = node
+            if children:
+                new_children = results[-len(children):]
+                del results[-len(children):]
+                if any(new is not old for new, old in zip(new_children, children)):
+                    node = rebuild(node, new_children)
+
+            result = get_handler(type(node))(self, node)
+            # Lookups are done by the node of source tree, not rebuilt one
+            memo[id(original)] = result
+            results.append(result)
+
+        return results[0]
+
+def rebuild(node: FrozenDict, children) -> FrozenDict:
+    """Return copy of node with child nodes replaced in iter_child_nodes order."""
+    children = iter(children)
+    changes = {}
+    for name, value in node.items():
+        if isinstance(value, FrozenDict):
+            changes[name] = next(children)
+        elif isinstance(value, tuple):
+            changes[name] = tuple(next(children) if isinstance(item, FrozenDict) else item
+                                  for item in value)
+    return node.replace(**changes)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+"""Watch mode: rebuild and rerun program on changes.
+
+Dependency graph of program is the main file and all included files
+(see units module). Files are polled by modification time, every change
+reloads the graph: unchanged units are taken from compilation cache
+(ast and objects), so only changed units pass through front end and backend.
+If program key is the same as before (file is touched or changed back),
+previous build is rerun without compilation.
+"""
+
+import os
+import sys
+import time
+import pathlib
+import subprocess
+
+from . import driver, units
+
+POLL_INTERVAL = 0.2
+
+class Watcher:
+
+    """Rebuild and rerun program, when its files are changed.
+
+    options are passed to driver.create_backend, compilation cache is
+    enabled by default. Executable is written to output (near the source
+    by default), if jit is set program is run in-process.
+    """
+
+    # Watcher keeps build options and state of the last build
+    #pylint: disable=too-many-instance-attributes
+
+    def __init__(self, filename, options=None, jit=False, args=(), output=None):
+        """See help(type(obj))."""
+        self.filename = pathlib.Path(filename).resolve()
+        self.options = dict({'cache': True}, **(options or {}))
+        self.jit = jit
+        self.args = tuple(args)
+        self.output = pathlib.Path(output if output is not None else
+                                   driver.output_filename(self.filename, 'exe')).resolve()
+
+        self.unit = None
+        self.backend = None
+        self.mtimes = {}
+
+    def dependencies(self) -> list:
+        """Return filenames of program files, main file is the first."""
+        filenames = [self.filename]
+        if self.unit is not None:
+            filenames.extend(unit.filename for unit in self.unit.walk()[:-1])
+        return filenames
+
+    def snapshot(self) -> dict:
+        """Return modification times of program files, None for missing file."""
+        mtimes = {}
+        for filename in self.dependencies():
+            try:
+                mtimes[filename] = os.stat(str(filename)).st_mtime_ns
+            except FileNotFoundError:
+                mtimes[filename] = None
+        return mtimes
+
+    def changed(self) -> bool:
+        """Check that program files are changed since last build."""
+        return self.snapshot() != self.mtimes
+
+    def build(self) -> bool:
+        """Rebuild program, if its code is changed.
+
+        Return True if program is rebuilt. Compilation errors are raised,
+        files are still watched.
+        """
+        # On errors files of previous graph are still watched
+        before = self.mtimes = self.snapshot()
+        backend = driver.create_backend(**self.options)
+        with open(str(self.filename), encoding='utf-8') as source:
+            unit = units.load_unit(source.read(), self.filename.parent, backend.cache,
+                                   self.filename)
+        previous, self.unit = self.unit, unit
+
+        # Times before loading, so changes while loading aren't missed
+        mtimes = self.snapshot()
+        mtimes.update((filename, mtime) for filename, mtime in before.items()
+                      if filename in mtimes)
+        self.mtimes = mtimes
+
+        if previous is not None and previous.key == unit.key and self.backend is not None:
+            return False
+
+        self.backend = None
+        units.compile_unit(unit, backend)
+        if not self.jit:
+            driver.emit(backend, 'exe', self.output)
+        self.backend = backend
+        return True
+
+    def run(self, **kwargs) -> subprocess.CompletedProcess:
+        """Run last build of program.
+
+        All keyword arguments pass to subprocess.run.
+        """
+        if self.jit:
+            return self.backend.run_jit(*self.args, check=False, **kwargs)
+        return subprocess.run((str(self.output), ) + self.args, check=False, **kwargs)
+
+    def report_error(self, error: Exception, stream):
+        """Write compilation or run error to stream."""
+        if isinstance(error, SyntaxError):
+            message = error.msg
+        else:
+            message = '{name}: {error}'.format(name=type(error).__name__, error=error)
+        print('{source}: {message}'.format(source=self.filename, message=message),
+              file=stream, flush=True)
+
+    def step(self, stream=sys.stderr):
+        """Rebuild and rerun program, report status to stream.
+
+        Return completed process or None on error, errors don't stop watching.
+        """
+        started = time.perf_counter()
+        try:
+            rebuilt = self.build()
+        except Exception as error: #pylint: disable=broad-except
+            self.report_error(error, stream)
+            return None
+
+        print('[{action} in {time:.3f}s]'.format(action='rebuilt' if rebuilt else 'unchanged',
+                                               time=time.perf_counter() - started),
+              file=stream, flush=True)
+        sys.stdout.flush()
+        try:
+            completed = self.run()
+        except Exception as error: #pylint: disable=broad-except
+            self.report_error(error, stream)
+            return None
+        print('[exit code {code}]'.format(code=completed.returncode), file=stream, flush=True)
+        return completed
+
+    def watch(self, interval=POLL_INTERVAL, stream=sys.stderr, iterations=None):
+        """Build and run program, then repeat on every change.
+
+        Files are polled every interval seconds, iterations limits count
+        of polls, it's infinite by default.
+        """
+        self.step(stream)
+        while iterations is None or iterations > 0:
+            time.sleep(interval)
+            if iterations is not None:
+                iterations -= 1
+            if self.changed():
+                self.step(stream)
@@ -14,6 +14,7 @@ import pathlib
 
 from setuptools import setup, find_packages, Extension
 from setuptools.command.build_ext import build_ext as build_ext_orig
+from setuptools.command.build_py import build_py as build_py_orig
 
 DOCLINES = (__doc__ or '').split("\n")
 
@@ -112,8 +113,16 @@ class build_ext(build_ext_orig):
         config = 'Debug' if self.debug else 'Release'
         cmake_args = [
             '-DCMAKE_ARCHIVE_OUTPUT_DIRECTORY=' + BBPROGRAM_SOURCE,
+            '-DCMAKE_LIBRARY_OUTPUT_DIRECTORY=' + BBPROGRAM_SOURCE,
             '-DCMAKE_BUILD_TYPE=' + config
         ]
+        try:
+            from llvmlite import binding
+        except ImportError:
+            pass
+        else:
+            # Runtime bitcode should be readable by llvm of llvmlite
+            cmake_args.append('-DLLVM_VERSION_MAJOR={}'.format(binding.llvm_version_info[0]))
 
         # build args
         build_args = [
@@ -126,6 +135,21 @@ class build_ext(build_ext_orig):
             self.spawn(['cmake', '--build', '.'] + build_args)
         os.chdir(str(cwd))
 
+class build_py(build_py_orig):
+
+    def run(self):
+        # Lexer and parser tables are shipped with package, so they aren't
+        # generated on every start (package directory can be read-only)
+        for table in ('lextab.py', 'parsetab.py'):
+            path = pathlib.Path(PROJECT) / table
+            if path.exists():
+                path.unlink()
+        self.spawn([sys.executable, '-c',
+                    'from {name} import lexer, parser; '
+                    'lexer.build_lexer(optimize=True); '
+                    'parser.build_parser(optimize=False)'.format(name=PROJECT)])
+        super().run()
+
 def setup_package():
     src_path = os.path.dirname(os.path.abspath(sys.argv[0]))
     old_path = os.getcwd()
@@ -156,9 +180,11 @@ def setup_package():
                      "Topic :: Software Development :: Libraries",
                      "License :: OSI Approved :: GNU Affero General Public License v3 or later (AGPLv3+)"],
         platforms = ['any'],
+        # Lexer and parser tables are generated by build_py
+        setup_requires=['ply>=3.11'],
         install_requires=['ply>=3.11',
                           'llvmlite>=0.24',
-                          'typeguard>=2.2.2',
+                          'typeguard>=2.2.2,<3',
                           'wheel>=0.31.1'],
         extras_require={
           'dev': [
@@ -174,6 +200,7 @@ def setup_package():
         ext_modules=[CMakeExtension('bbruntime')],
         cmdclass={
             'build_ext': build_ext,
+            'build_py': build_py,
         }
     )
 